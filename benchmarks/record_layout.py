@@ -0,0 +1,132 @@
+"""
+Compare the memory use and throughput of holding readings as pydantic
+`GlucoseReading` models with compact `ReadingRecord`s.
+
+The baseline is a dict of models keyed by reading UUID, as the fake store
+held readings before it held records. The first read of a record creates
+its model, so the fake store is measured both cold (first read) and warm.
+The SQLite store validates every reading it reads from the database.
+
+Run from the repository root with:
+```
+PYTHONPATH=src python benchmarks/record_layout.py --readings 100000
+```
+
+"""
+from argparse import ArgumentParser
+import datetime as dt
+import gc
+import time
+import tracemalloc
+from typing import Any, Callable, List, Tuple
+from uuid import uuid4
+
+from sqlalchemy import create_engine
+
+from glucose_reading_store.models import GlucoseReading
+from glucose_reading_store.records import ReadingRecord
+from glucose_reading_store.stores import (
+    FakeGlucoseReadingStore,
+    SQLAlchemyGlucoseReadingStore,
+)
+
+
+def make_readings(count: int) -> List[GlucoseReading]:
+    """Make some readings for a handful of patients."""
+    patient_uuids = [uuid4() for _ in range(100)]
+    start = dt.datetime(2022, 1, 1, tzinfo=dt.timezone.utc)
+    return [
+        GlucoseReading(
+            patient_uuid=patient_uuids[index % len(patient_uuids)],
+            value=f"{4 + index % 60 / 10:.1f}",
+            unit="mmol/L",
+            recorded_at=start + dt.timedelta(minutes=index),
+        )
+        for index in range(count)
+    ]
+
+
+def measure_memory(build: Callable[[], Any]) -> Tuple[Any, int]:
+    """Return the result of `build`, and the bytes it allocated (and kept)."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, allocated
+
+
+def measure_rate(func: Callable[[], Any], count: int) -> float:
+    """Return the number of items per second `func` processes."""
+    started = time.perf_counter()
+    func()
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    """Run the benchmarks and print the results."""
+    parser = ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--readings", type=int, default=100_000)
+    args = parser.parse_args()
+    count = args.readings
+
+    readings = make_readings(count)
+    as_dicts = [reading.dict() for reading in readings]
+
+    # Memory held by each layout (the readings are copied so the source
+    # readings aren't counted).
+    models, model_bytes = measure_memory(
+        lambda: [GlucoseReading.construct(**values) for values in as_dicts]
+    )
+    records, record_bytes = measure_memory(
+        lambda: [ReadingRecord.from_reading(reading) for reading in readings]
+    )
+    print(f"Memory for {count:,} readings:")
+    print(f"  GlucoseReading: {model_bytes / count:8.1f} bytes/reading")
+    print(f"  ReadingRecord:  {record_bytes / count:8.1f} bytes/reading")
+    del models
+
+    print("Throughput (readings/s):")
+    rate = measure_rate(
+        lambda: [GlucoseReading(**values) for values in as_dicts], count
+    )
+    print(f"  validate GlucoseReading:       {rate:12,.0f}")
+    rate = measure_rate(lambda: [record.to_reading() for record in records], count)
+    print(f"  ReadingRecord -> GlucoseReading: {rate:10,.0f}")
+    rate = measure_rate(
+        lambda: [ReadingRecord.from_reading(reading) for reading in readings], count
+    )
+    print(f"  GlucoseReading -> ReadingRecord: {rate:10,.0f}")
+
+    reading_uuids = [reading.reading_uuid for reading in readings]
+    baseline = {reading.reading_uuid: reading for reading in readings}
+    rate = measure_rate(lambda: list(baseline.values()), count)
+    print(f"  baseline (models) iterate:     {rate:12,.0f}")
+    rate = measure_rate(lambda: [baseline[uuid] for uuid in reading_uuids], count)
+    print(f"  baseline (models) get_reading: {rate:12,.0f}")
+
+    store = FakeGlucoseReadingStore()
+    rate = measure_rate(lambda: store.add_readings(readings), count)
+    print(f"  fake store add_readings:       {rate:12,.0f}")
+    for temperature in ["cold", "warm"]:
+        rate = measure_rate(lambda: list(store.iterate_readings()), count)
+        print(f"  fake store iterate ({temperature}):     {rate:12,.0f}")
+    store = FakeGlucoseReadingStore()
+    store.add_readings(readings)
+    for temperature in ["cold", "warm"]:
+        rate = measure_rate(
+            lambda: [store.get_reading(uuid) for uuid in reading_uuids], count
+        )
+        print(f"  fake store get_reading ({temperature}): {rate:12,.0f}")
+
+    sqlite_store = SQLAlchemyGlucoseReadingStore(create_engine("sqlite://"))
+    with sqlite_store:
+        sqlite_store.add_readings(readings)
+    with sqlite_store:
+        rate = measure_rate(lambda: list(sqlite_store.iterate_readings()), count)
+    print(f"  SQLite store iterate:          {rate:12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
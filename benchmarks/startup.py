@@ -0,0 +1,122 @@
+"""
+Measure import and startup times: importing the packages, running the CLI
+with `--help` and creating a SQLAlchemy store with each schema mode.
+
+Each measurement runs in a fresh interpreter, so nothing is already
+imported or cached. Run from the repository root with:
+```
+PYTHONPATH=src python benchmarks/startup.py --repeats 10
+```
+
+"""
+from argparse import ArgumentParser
+import os
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+import time
+from typing import List
+
+SRC_DIRECTORY = Path(__file__).resolve().parent.parent / "src"
+
+TIMED_SNIPPET = """
+import time
+started = time.perf_counter()
+{code}
+print(time.perf_counter() - started)
+"""
+
+STORE_SNIPPET = """
+from sqlalchemy import create_engine
+from glucose_reading_store.stores.sqlalchemy import SQLAlchemyGlucoseReadingStore
+engine = create_engine({url!r})
+started = time.perf_counter()
+SQLAlchemyGlucoseReadingStore(engine, schema_mode={schema_mode!r})
+"""
+
+
+def _environment():
+    """The environment of the timed interpreters, with `src` importable."""
+    environment = dict(os.environ)
+    python_path = [str(SRC_DIRECTORY), environment.get("PYTHONPATH", "")]
+    environment["PYTHONPATH"] = os.pathsep.join(filter(None, python_path))
+    return environment
+
+
+def time_in_process(code: str, repeats: int) -> List[float]:
+    """Time some code (which may reset `started`) in fresh interpreters."""
+    timings = []
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, "-c", TIMED_SNIPPET.format(code=code)],
+            check=True,
+            capture_output=True,
+            text=True,
+            env=_environment(),
+        )
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def time_command(args: List[str], repeats: int) -> List[float]:
+    """Time a command (including interpreter startup) from start to exit."""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        subprocess.run(args, check=True, capture_output=True, env=_environment())
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def report(name: str, timings: List[float]):
+    """Print the median and spread of some timings in milliseconds."""
+    print(
+        f"  {name:<42} median {statistics.median(timings) * 1000:7.1f} ms "
+        + f"(min {min(timings) * 1000:.1f}, max {max(timings) * 1000:.1f})"
+    )
+
+
+def main():
+    """Run the benchmarks and print the results."""
+    parser = ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--repeats", type=int, default=10)
+    repeats = parser.parse_args().repeats
+
+    print("Imports:")
+    report(
+        "import glucose_reading_store",
+        time_in_process("import glucose_reading_store", repeats),
+    )
+    report(
+        "import the store's public names",
+        time_in_process("from glucose_reading_store import *", repeats),
+    )
+    report(
+        "import glucose_reading_server.app",
+        time_in_process("import glucose_reading_server.app", repeats),
+    )
+
+    print("Command line:")
+    report(
+        "glucose-reading-server --help",
+        time_command(
+            [sys.executable, "-m", "glucose_reading_server", "--help"], repeats
+        ),
+    )
+
+    print("Creating a SQLite store (excluding imports):")
+    with TemporaryDirectory() as temp_dir:
+        url = f"sqlite:///{Path(temp_dir, 'startup.db')}"
+        for schema_mode in ["create", "verify", "skip"]:
+            report(
+                f"schema mode {schema_mode!r}",
+                time_in_process(
+                    STORE_SNIPPET.format(url=url, schema_mode=schema_mode), repeats
+                ),
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -17,7 +17,9 @@ extra_requirements = {
         "pylint==2.12.2",
         "pytest==7.1.1",
         "sqlalchemy2-stubs==0.0.2a20",
-    ]
+    ],
+    "export": ["pyarrow>=7.0.0"],
+    "msgpack": ["msgpack>=1.0.0"],
 }
 
 setup(
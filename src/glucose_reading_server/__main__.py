@@ -1,11 +1,143 @@
-"""Command line app to launch the glucose reading server."""
-from argparse import ArgumentParser
+"""
+Command line app to launch the glucose reading server.
+
+The server (and anything else heavy) is only imported once the command to
+run is known, so `--help` and the other commands start quickly.
+
+"""
+from argparse import ArgumentParser, Namespace
+from contextlib import nullcontext
+import datetime as dt
 import os
+from typing import ContextManager
+
+from glucose_reading_store.bulk_import import (
+    IMPORT_FORMATS,
+    ImportProgress,
+    import_readings,
+)
+from glucose_reading_store.common import SCHEMA_MODES
+from glucose_reading_store.export import EXPORT_FORMATS, export_readings
+
+
+def export(args: Namespace):
+    """Export readings from the reading store to a file."""
+    # pylint: disable=import-outside-toplevel
+    from .dependencies import reading_store
+    from .models import ExportRequest
+
+    export_request = ExportRequest(
+        export_format=args.format,
+        patient_uuids=args.patient_uuid,
+        start=args.start,
+        end=args.end,
+    )
+    with open(args.output, "wb") as file:
+        for data in export_readings(
+            reading_store.get(),
+            export_request.export_format,
+            export_request.patient_uuids,
+            export_request.start,
+            export_request.end,
+            args.chunk_size,
+        ):
+            file.write(data)
+
+
+def archive(args: Namespace):
+    """Move readings older than some number of days to the reading archive."""
+    from .dependencies import reading_store  # pylint: disable=import-outside-toplevel
+
+    before = dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=args.older_than_days)
+    archived = reading_store.get().archive_readings(before)
+    print(f"Archived {archived} readings recorded before {before.isoformat()}")
+
+
+def print_import_progress(progress: ImportProgress):
+    """Print the progress of an import."""
+    print(
+        f"{progress.path}: {progress.rows_read} rows read, {progress.rows_imported} "
+        + f"imported, {progress.rows_skipped} skipped "
+        + f"({progress.rows_per_second:,.0f} rows/s)"
+    )
 
-import uvicorn  # type: ignore
 
-from .app import APP
-from .dependencies import set_reading_store_engine, set_test_reading_store
+def import_files(args: Namespace):
+    """Import readings from files into the reading store."""
+    # pylint: disable=import-outside-toplevel
+    from glucose_reading_store.stores import SQLAlchemyGlucoseReadingStore
+
+    from .dependencies import reading_store
+
+    store = reading_store.get()
+    indexes_dropped: ContextManager[None]
+    if args.drop_indexes and isinstance(store, SQLAlchemyGlucoseReadingStore):
+        indexes_dropped = store.without_indexes()
+    else:
+        indexes_dropped = nullcontext()
+
+    with indexes_dropped:
+        for path in args.paths:
+            import_readings(
+                store,
+                path,
+                import_format=args.format,
+                batch_size=args.batch_size,
+                workers=args.workers,
+                checkpoint_path=args.checkpoint,
+                skip_invalid=args.skip_invalid,
+                progress=print_import_progress,
+            )
+
+
+def serve(args: Namespace):
+    """Run the glucose reading server."""
+    # pylint: disable=import-outside-toplevel
+    import uvicorn  # type: ignore
+
+    from .app import APP
+    from .middleware import install_middleware
+
+    install_middleware(APP)
+    uvicorn.run(APP, host=args.address, port=args.port, log_level="info")
+
+
+def set_dependencies(args: Namespace):
+    """Set the reading store and the server's other dependencies from the args."""
+    # pylint: disable=import-outside-toplevel
+    from .dependencies import (
+        set_concurrency_limiter,
+        set_idempotency_key_store,
+        set_reading_store_engine,
+        set_request_profiler,
+        set_test_reading_store,
+    )
+
+    set_idempotency_key_store(args.idempotency_cache_size, args.idempotency_ttl)
+    set_request_profiler(
+        args.admin_token or os.getenv("GLUC_ADMIN_TOKEN"),
+        args.profile_sample_rate,
+        args.slow_request_buffer,
+    )
+    if args.target_latency_ms is not None:
+        set_concurrency_limiter(args.target_latency_ms / 1000, args.max_concurrency)
+    if args.test_mode:
+        set_test_reading_store(args.unique_patient_time, args.archive_dir)
+        return
+
+    connection_string = args.connection_string or os.getenv("GLUC_STORE_CONN_STR")
+    if connection_string is None:
+        raise ValueError(
+            "Error getting glucose data store. Set 'GLUC_STORE_CONN_STR' env var "
+            + "to SQLAlchemy connection string or specify '--connection-string' "
+            + "CLI arg"
+        )
+    set_reading_store_engine(
+        connection_string,
+        args.unique_patient_time,
+        args.archive_dir,
+        args.schema_mode,
+    )
 
 
 def main():
@@ -41,22 +173,195 @@ def main():
             + "a database and will not persist them between sessions"
         ),
     )
+    parser.add_argument(
+        "--unique-patient-time",
+        action="store_true",
+        help=(
+            "only allow a single reading per patient at any given time. Readings "
+            + "submitted again for the same patient and time return the original"
+        ),
+    )
+    parser.add_argument(
+        "--idempotency-cache-size",
+        type=int,
+        help="the maximum number of 'Idempotency-Key' headers to remember",
+        default=10_000,
+    )
+    parser.add_argument(
+        "--idempotency-ttl",
+        type=float,
+        help="the number of seconds to remember 'Idempotency-Key' headers for",
+        default=24 * 60 * 60,
+    )
+
+    parser.add_argument(
+        "--archive-dir",
+        help=(
+            "a directory holding archived readings (requires 'pyarrow'). Readings "
+            + "which aren't in the store are fetched from the archive"
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--admin-token",
+        help=(
+            "a token which the admin endpoints ('/v1/admin/...') require in an "
+            + "'X-Admin-Token' header (they're disabled without one), and which "
+            + "enables profiling of a request (in an 'X-Profile' header). This can "
+            + "also be set as an environment variable ('GLUC_ADMIN_TOKEN')"
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--profile-sample-rate",
+        type=float,
+        help="the fraction of requests to profile",
+        default=0.0,
+    )
+    parser.add_argument(
+        "--slow-request-buffer",
+        type=int,
+        help="the number of the slowest profiled requests to keep",
+        default=20,
+    )
+    parser.add_argument(
+        "--target-latency-ms",
+        type=float,
+        help=(
+            "limit the number of requests in flight, adapting the limit to keep "
+            + "request latency under this many milliseconds. Requests over the "
+            + "limit fail fast with status 503"
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        help="the most requests allowed in flight with '--target-latency-ms'",
+        default=100,
+    )
+    parser.add_argument(
+        "--schema-mode",
+        choices=SCHEMA_MODES,
+        help=(
+            "whether to create (or update) the database schema if it isn't the "
+            + "current version, only verify it, or skip checking it entirely"
+        ),
+        default="create",
+    )
+
+    subparsers = parser.add_subparsers(
+        dest="command",
+        title="commands",
+        description="commands other than running the server (the default)",
+    )
+    export_parser = subparsers.add_parser(
+        "export", help="export readings in a columnar format (requires 'pyarrow')"
+    )
+    export_parser.add_argument(
+        "--output", "-o", required=True, help="the file to write the readings to"
+    )
+    export_parser.add_argument(
+        "--format",
+        "-f",
+        choices=EXPORT_FORMATS,
+        help="the export format (an Arrow IPC stream or a Parquet file)",
+        default="arrow",
+    )
+    export_parser.add_argument(
+        "--patient-uuid",
+        action="append",
+        help="only export readings for this patient. Can be given more than once",
+    )
+    export_parser.add_argument(
+        "--start",
+        help="only export readings recorded from this TZ-aware ISO-8601 timestamp",
+    )
+    export_parser.add_argument(
+        "--end",
+        help="only export readings recorded before this TZ-aware ISO-8601 timestamp",
+    )
+    export_parser.add_argument(
+        "--chunk-size",
+        type=int,
+        help="the number of readings to fetch from the store at a time",
+        default=10_000,
+    )
+
+    archive_parser = subparsers.add_parser(
+        "archive",
+        help="move old readings to the archive set with '--archive-dir'",
+    )
+    archive_parser.add_argument(
+        "--older-than-days",
+        type=float,
+        required=True,
+        help="archive readings recorded more than this many days ago",
+    )
+
+    import_parser = subparsers.add_parser(
+        "import", help="bulk import readings from CSV or NDJSON files"
+    )
+    import_parser.add_argument(
+        "paths",
+        nargs="+",
+        help=(
+            "the files to import. CSV files need a header row, and the columns "
+            + "(or NDJSON keys) are the fields of a reading"
+        ),
+    )
+    import_parser.add_argument(
+        "--format",
+        "-f",
+        choices=IMPORT_FORMATS,
+        help="the format of the files (by default, inferred from the file extension)",
+        default=None,
+    )
+    import_parser.add_argument(
+        "--batch-size",
+        type=int,
+        help="the number of readings to validate and insert at a time",
+        default=5_000,
+    )
+    import_parser.add_argument(
+        "--workers",
+        type=int,
+        help="the number of processes used to validate readings",
+        default=os.cpu_count() or 1,
+    )
+    import_parser.add_argument(
+        "--checkpoint",
+        help=(
+            "a file to record progress in. Re-running an interrupted import with "
+            + "the same checkpoint file resumes it"
+        ),
+        default=None,
+    )
+    import_parser.add_argument(
+        "--skip-invalid",
+        action="store_true",
+        help="skip invalid readings, instead of stopping the import",
+    )
+    import_parser.add_argument(
+        "--drop-indexes",
+        action="store_true",
+        help=(
+            "drop the database's non-unique indexes during the import, and rebuild "
+            + "them after"
+        ),
+    )
 
     args = parser.parse_args()
 
-    if args.test_mode:
-        set_test_reading_store()
+    set_dependencies(args)
+    if args.command == "export":
+        export(args)
+    elif args.command == "archive":
+        archive(args)
+    elif args.command == "import":
+        import_files(args)
     else:
-        connection_string = args.connection_string or os.getenv("GLUC_STORE_CONN_STR")
-        if connection_string is None:
-            raise ValueError(
-                "Error getting glucose data store. Set 'GLUC_STORE_CONN_STR' env var "
-                + "to SQLAlchemy connection string or specify '--connection-string' "
-                + "CLI arg"
-            )
-        set_reading_store_engine(connection_string)
-
-    uvicorn.run(APP, host=args.address, port=args.port, log_level="info")
+        serve(args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,125 @@
+"""
+Adaptive admission control of requests which use the reading store.
+
+The number of requests allowed in flight is adjusted from their observed
+latency (additive increase, multiplicative decrease): the limit grows
+while requests finish within the target latency, and is cut back when
+they don't. Lower priority requests (e.g. bulk listings and exports) are
+only admitted while the number in flight is below a fraction of the
+limit, so they're shed first. Shed requests fail fast, rather than
+queueing and slowing down every other request.
+
+"""
+import time
+from typing import Dict, NamedTuple, Optional
+
+READ_PRIORITY = 1.0
+"""The priority of requests for single readings."""
+WRITE_PRIORITY = 0.9
+"""The priority of requests which change readings."""
+BULK_PRIORITY = 0.5
+"""The priority of requests for many readings (listings and exports)."""
+
+_BULK_PATHS = {"/v1/reading", "/v1/reading/export"}
+_UNLIMITED_PATH_PREFIXES = ("/v1/admin/", "/docs", "/redoc", "/openapi.json")
+
+
+def request_priority(method: str, path: str) -> Optional[float]:
+    """
+    The priority of a request, or `None` if the request doesn't use the
+    reading store (and so shouldn't be limited).
+
+    """
+    if path.startswith(_UNLIMITED_PATH_PREFIXES):
+        return None
+    if method == "GET" and path in _BULK_PATHS:
+        return BULK_PRIORITY
+    if method in {"GET", "HEAD"} or path.endswith(":batchGet"):
+        return READ_PRIORITY
+    return WRITE_PRIORITY
+
+
+class AdmissionMetrics(NamedTuple):
+    """The state of an adaptive concurrency limiter."""
+
+    limit: float
+    """The current limit on the number of requests in flight."""
+    in_flight: int
+    admitted: int
+    shed: int
+
+
+class AdaptiveConcurrencyLimiter:  # pylint: disable=too-many-instance-attributes
+    """
+    Limits the number of requests in flight, adjusting the limit from
+    `min_limit` to `max_limit` so requests finish within `target_latency`
+    seconds.
+
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        initial_limit: float = 20,
+        min_limit: float = 1,
+        max_limit: float = 100,
+        target_latency: float = 0.1,
+        backoff: float = 0.9,
+        retry_after: int = 1,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        # The number of seconds shed clients should wait before retrying.
+        self.retry_after = retry_after
+        self._limit = max(min_limit, min(initial_limit, max_limit))
+        self._in_flight = 0
+        self._admitted = 0
+        self._shed = 0
+        self._last_decrease = 0.0
+
+    def try_acquire(self, priority: float) -> bool:
+        """
+        Admit a request with a priority (from 0 to 1) if there's capacity for
+        it. If admitted, `release` must be called when the request finishes.
+
+        """
+        if self._in_flight >= max(self.min_limit, self._limit * priority):
+            self._shed += 1
+            return False
+        self._in_flight += 1
+        self._admitted += 1
+        return True
+
+    def release(self, latency: Optional[float] = None):
+        """
+        Release an admitted request, adjusting the limit from its latency in
+        seconds (if given).
+
+        """
+        self._in_flight -= 1
+        if latency is None:
+            return
+
+        if latency <= self.target_latency:
+            # Grow the limit by about 1 for each full limit of fast requests.
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            return
+
+        # Only back off once per target latency, so a burst of slow requests
+        # which were admitted together doesn't collapse the limit.
+        now = time.monotonic()
+        if now - self._last_decrease >= self.target_latency:
+            self._limit = max(self.min_limit, self._limit * self.backoff)
+            self._last_decrease = now
+
+    @property
+    def metrics(self) -> AdmissionMetrics:
+        """The current limit and counts of admitted and shed requests."""
+        return AdmissionMetrics(
+            self._limit, self._in_flight, self._admitted, self._shed
+        )
+
+    def retry_headers(self) -> Dict[str, str]:
+        """The headers of a response to a shed request."""
+        return {"Retry-After": str(self.retry_after)}
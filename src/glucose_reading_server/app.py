@@ -2,24 +2,80 @@
 App routing for the glucose reading server.
 
 """
-from typing import List
+import datetime as dt
+from typing import Any, Callable, Dict, List, Optional, TypeVar
 from uuid import UUID
 
-from fastapi import FastAPI, Request, Response
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse, PlainTextResponse
-from pydantic import ValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import ValidationError, parse_obj_as  # pylint: disable=no-name-in-module
 
+from glucose_reading_store.export import (
+    EXPORT_FILE_EXTENSIONS,
+    EXPORT_MEDIA_TYPES,
+    check_export_available,
+    export_readings,
+)
 from glucose_reading_store.models import GlucoseReading
 from glucose_reading_store.exceptions import NoSuchReading, DuplicateReading
+from glucose_reading_store.stores import AbstractGlucoseReadingStore
 
-from .dependencies import reading_store
-from .models import ReadingCreateRequest, ReadingUpdateRequest
+from .dependencies import (
+    concurrency_limiter,
+    idempotency_keys,
+    reading_store,
+    request_profiler,
+    single_flight,
+)
+from .encoding import (
+    check_acceptable,
+    decode_batch_get_request,
+    decode_create_request,
+    encode_batch_get_response,
+    encode_reading,
+    request_body_schema,
+)
+from .idempotency import IdempotencyKeyReused
+from .models import (
+    BatchGetRequest,
+    BatchGetResponse,
+    ExportRequest,
+    ReadingCreateRequest,
+    ReadingUpdateRequest,
+)
+from .profiling import phase, profile_thread
 
+T = TypeVar("T")  # pylint: disable=invalid-name
 
 APP = FastAPI()
 
 
+def _store_read(read: Callable[[AbstractGlucoseReadingStore], T]) -> Callable[[], T]:
+    """
+    Wrap a read from the reading store so it can be run (and shared) by the
+    single-flight group in a worker thread.
+
+    """
+    store = reading_store.get()
+
+    def run_read() -> T:
+        with profile_thread(), phase("store"), store:
+            return read(store)
+
+    return run_read
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """
+    Make sure the request has the admin token. Admin-only endpoints are
+    disabled if no admin token is set.
+
+    """
+    if not request_profiler.get().is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="An admin token is required.")
+
+
 @APP.exception_handler(RequestValidationError)
 async def handle_inbound_validation_failure(
     _: Request, exc: RequestValidationError
@@ -52,35 +108,149 @@ async def handle_duplicate_reading(_: Request, exc: DuplicateReading) -> JSONRes
     return JSONResponse(status_code=400, content=repr(exc))
 
 
+@APP.exception_handler(IdempotencyKeyReused)
+async def handle_idempotency_key_reused(
+    _: Request, exc: IdempotencyKeyReused
+) -> JSONResponse:
+    """Return status 422 for idempotency keys reused with a different request."""
+    return JSONResponse(status_code=422, content=repr(exc))
+
+
 @APP.get("/v1/reading", status_code=200)
 async def list_readings() -> List[GlucoseReading]:
     """List all glucose readings."""
-    store = reading_store.get()
-    with store:
-        return list(store)
+    return await single_flight.get().do(("readings",), _store_read(list))
 
 
-@APP.post("/v1/reading", status_code=201)
-async def add_reading(create_request: ReadingCreateRequest) -> GlucoseReading:
-    """Process a reading create request, returning the reading."""
+@APP.post(
+    "/v1/reading",
+    status_code=201,
+    dependencies=[Depends(check_acceptable)],
+    openapi_extra=request_body_schema(ReadingCreateRequest),
+)
+async def add_reading(
+    request: Request,
+    create_request: ReadingCreateRequest = Depends(decode_create_request),
+    idempotency_key: Optional[str] = Header(None),
+) -> Response:
+    """
+    Process a reading create request (as JSON or MessagePack), returning the
+    reading.
+
+    If the request is a retry (i.e. it has the same `Idempotency-Key` header
+    as a previous request, or the store already has a reading for the patient
+    at the same time) the original reading is returned with status 200.
+
+    """
+    replayed_headers = {"Idempotent-Replayed": "true"}
+
+    keys = idempotency_keys.get()
+    if idempotency_key is not None:
+        original_reading = keys.get(idempotency_key, create_request)
+        if original_reading is not None:
+            return encode_reading(request, original_reading, 200, replayed_headers)
+
     store = reading_store.get()
-    with store:
-        reading = GlucoseReading(
+    status_code, headers = 201, None
+    with phase("store"), store:
+        # The create request has already been validated, so skip validating
+        # the reading again.
+        reading = GlucoseReading.construct(
             patient_uuid=create_request.patient_uuid,
             value=create_request.value,
             unit=create_request.unit,
             recorded_at=create_request.recorded_at,
         )
-        store.add_reading(reading)
-        return reading
+        try:
+            store.add_reading(reading)
+        except DuplicateReading:
+            # The reading UUID is new, so this is a duplicate natural key.
+            reading = store.find_reading(
+                create_request.patient_uuid, create_request.recorded_at
+            )
+            if (reading.value, reading.unit) != (
+                create_request.value,
+                create_request.unit,
+            ):
+                raise
+            status_code, headers = 200, replayed_headers
+        else:
+            single_flight.get().forget(("readings",), ("latest", reading.patient_uuid))
+
+    if idempotency_key is not None:
+        keys.put(idempotency_key, create_request, reading)
+    return encode_reading(request, reading, status_code, headers)
+
+
+@APP.get("/v1/reading/export", status_code=200)
+async def export_reading_file(  # pylint: disable=redefined-builtin
+    format: str = Query("arrow"),
+    patient_uuid: Optional[List[UUID]] = Query(None),
+    start: Optional[dt.datetime] = None,
+    end: Optional[dt.datetime] = None,
+) -> Response:
+    """
+    Stream readings (optionally filtered by patient and time recorded) as an
+    Arrow IPC stream or a Parquet file.
+
+    """
+    export_request = ExportRequest(
+        export_format=format, patient_uuids=patient_uuid, start=start, end=end
+    )
+    try:
+        check_export_available()
+    except ImportError as err:
+        return PlainTextResponse(status_code=501, content=str(err))
+
+    export_format = export_request.export_format
+    filename = f"readings.{EXPORT_FILE_EXTENSIONS[export_format]}"
+    return StreamingResponse(
+        export_readings(
+            reading_store.get(),
+            export_format,
+            export_request.patient_uuids,
+            export_request.start,
+            export_request.end,
+        ),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
-@APP.get("/v1/reading/{reading_uuid}")
-async def get_reading(reading_uuid: UUID) -> GlucoseReading:
-    """Get a glucose reading from its UUID."""
+@APP.post(
+    "/v1/reading:batchGet",
+    status_code=200,
+    dependencies=[Depends(check_acceptable)],
+    response_model=BatchGetResponse,
+    openapi_extra=request_body_schema(BatchGetRequest),
+)
+async def batch_get_readings(
+    request: Request,
+    batch_get_request: BatchGetRequest = Depends(decode_batch_get_request),
+) -> Response:
+    """
+    Get several glucose readings from their UUIDs (as JSON or MessagePack),
+    returning the readings found and the UUIDs of any missing readings.
+
+    """
+    reading_uuids = list(dict.fromkeys(batch_get_request.reading_uuids))
     store = reading_store.get()
     with store:
-        return store.get_reading(reading_uuid)
+        found = store.get_readings(reading_uuids)
+
+    readings = [found[uuid] for uuid in reading_uuids if uuid in found]
+    missing = [uuid for uuid in reading_uuids if uuid not in found]
+    return encode_batch_get_response(request, readings, missing)
+
+
+@APP.get("/v1/reading/{reading_uuid}", dependencies=[Depends(check_acceptable)])
+async def get_reading(request: Request, reading_uuid: UUID) -> Response:
+    """Get a glucose reading from its UUID (as JSON or MessagePack)."""
+    reading = await single_flight.get().do(
+        ("reading", reading_uuid),
+        _store_read(lambda store: store.get_reading(reading_uuid)),
+    )
+    return encode_reading(request, reading, 200)
 
 
 @APP.put("/v1/reading/{reading_uuid}", status_code=204)
@@ -100,6 +270,12 @@ async def update_reading(
             recorded_at=update_request.recorded_at or current_reading.recorded_at,
         )
         store.update_reading(reading)
+    single_flight.get().forget(
+        ("readings",),
+        ("reading", reading_uuid),
+        ("latest", current_reading.patient_uuid),
+        ("latest", reading.patient_uuid),
+    )
 
     response.status_code = 204
     response.body = b""
@@ -113,7 +289,90 @@ async def delete_reading(reading_uuid: UUID, response: Response) -> Response:
 
     with store:
         store.delete_reading(reading_uuid)
+    flight = single_flight.get()
+    flight.forget(("readings",), ("reading", reading_uuid))
+    # The reading's patient isn't known without fetching it first, so forget
+    # every in-flight latest reading instead.
+    flight.forget_kind("latest")
 
     response.status_code = 204
     response.body = b""
     return response
+
+
+@APP.get("/v1/patient/{patient_uuid}/latest", dependencies=[Depends(check_acceptable)])
+async def get_latest_reading(request: Request, patient_uuid: UUID) -> Response:
+    """
+    Get a patient's latest glucose reading (as JSON or MessagePack), or 404
+    if the patient has no readings.
+
+    """
+    reading = await single_flight.get().do(
+        ("latest", patient_uuid),
+        _store_read(lambda store: store.get_latest_reading(patient_uuid)),
+    )
+    return encode_reading(request, reading, 200)
+
+
+@APP.get("/v1/patients/latest", status_code=200)
+async def get_latest_readings(ids: str = Query(...)) -> List[GlucoseReading]:
+    """
+    Get the latest glucose readings of some patients, given as a comma
+    separated list of patient UUIDs. Patients with no readings are left out.
+
+    """
+    patient_uuids = parse_obj_as(
+        List[UUID], [patient_uuid.strip() for patient_uuid in ids.split(",")]
+    )
+    store = reading_store.get()
+    with store:
+        latest_readings = store.get_latest_readings(patient_uuids)
+    return [
+        latest_readings[patient_uuid]
+        for patient_uuid in dict.fromkeys(patient_uuids)
+        if patient_uuid in latest_readings
+    ]
+
+
+@APP.get(
+    "/v1/admin/single-flight",
+    status_code=200,
+    dependencies=[Depends(require_admin_token)],
+)
+async def get_single_flight_metrics() -> Dict[str, int]:
+    """
+    Get counts of the store reads which were run or shared (coalesced)
+    (requires the admin token in the `X-Admin-Token` header).
+
+    """
+    return single_flight.get().metrics._asdict()
+
+
+@APP.get(
+    "/v1/admin/profiles",
+    status_code=200,
+    dependencies=[Depends(require_admin_token)],
+)
+async def get_slow_request_profiles() -> List[Dict[str, Any]]:
+    """
+    Get the profiles of the slowest profiled requests (requires the admin
+    token in the `X-Admin-Token` header).
+
+    """
+    return [profile.to_dict() for profile in request_profiler.get().slowest()]
+
+
+@APP.get(
+    "/v1/admin/concurrency-limit",
+    status_code=200,
+    dependencies=[Depends(require_admin_token)],
+)
+async def get_concurrency_limit() -> Optional[Dict[str, float]]:
+    """
+    Get the current limit on requests in flight and counts of admitted and
+    shed requests, or null if requests aren't limited (requires the admin
+    token in the `X-Admin-Token` header).
+
+    """
+    limiter = concurrency_limiter.get()
+    return None if limiter is None else limiter.metrics._asdict()
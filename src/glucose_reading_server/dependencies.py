@@ -1,23 +1,108 @@
 """Dependencies required by the API."""
 from contextvars import ContextVar
+from typing import Optional
 
 from sqlalchemy import create_engine
 
+from glucose_reading_store.archive import ReadingArchive
 from glucose_reading_store.stores import (
     AbstractGlucoseReadingStore,
     FakeGlucoseReadingStore,
     SQLAlchemyGlucoseReadingStore,
 )
 
+from .admission import AdaptiveConcurrencyLimiter
+from .idempotency import IdempotencyKeyStore
+from .profiling import RequestProfiler, instrument_engine
+from .single_flight import SingleFlight
+
 reading_store: ContextVar[AbstractGlucoseReadingStore] = ContextVar("reading_store")
+idempotency_keys: ContextVar[IdempotencyKeyStore] = ContextVar(
+    "idempotency_keys", default=IdempotencyKeyStore()
+)
+single_flight: ContextVar[SingleFlight] = ContextVar(
+    "single_flight", default=SingleFlight()
+)
+request_profiler: ContextVar[RequestProfiler] = ContextVar(
+    "request_profiler", default=RequestProfiler()
+)
+concurrency_limiter: ContextVar[Optional[AdaptiveConcurrencyLimiter]] = ContextVar(
+    "concurrency_limiter", default=None
+)
+
+
+def _get_archive(archive_directory: Optional[str]) -> Optional[ReadingArchive]:
+    """Get the reading archive in a directory, if a directory is given."""
+    if archive_directory is None:
+        return None
+    return ReadingArchive(archive_directory)
+
 
+def set_reading_store_engine(
+    connection_string: str,
+    unique_patient_time: bool = False,
+    archive_directory: Optional[str] = None,
+    schema_mode: str = "create",
+):
+    """
+    Set the reading store's engine from a connection string. `schema_mode`
+    sets whether the database schema is created, verified or assumed ready.
 
-def set_reading_store_engine(connection_string: str):
-    """Set the reading store's engine from a connection string."""
+    """
     engine = create_engine(connection_string)
-    reading_store.set(SQLAlchemyGlucoseReadingStore(engine))
+    instrument_engine(engine)
+    reading_store.set(
+        SQLAlchemyGlucoseReadingStore(
+            engine,
+            unique_patient_time=unique_patient_time,
+            archive=_get_archive(archive_directory),
+            schema_mode=schema_mode,
+        )
+    )
 
 
-def set_test_reading_store():
+def set_test_reading_store(
+    unique_patient_time: bool = False, archive_directory: Optional[str] = None
+):
     """Set the reading store to use a test store."""
-    reading_store.set(FakeGlucoseReadingStore())
+    reading_store.set(
+        FakeGlucoseReadingStore(
+            unique_patient_time=unique_patient_time,
+            archive=_get_archive(archive_directory),
+        )
+    )
+
+
+def set_idempotency_key_store(max_size: int, ttl: float):
+    """Set the size and expiry time (in seconds) of the idempotency key store."""
+    idempotency_keys.set(IdempotencyKeyStore(max_size=max_size, ttl=ttl))
+
+
+def set_request_profiler(
+    admin_token: Optional[str], sample_rate: float, buffer_size: int
+):
+    """
+    Set the admin token which enables profiling for a request, the fraction
+    of requests to profile and the number of slow requests to keep.
+
+    """
+    request_profiler.set(
+        RequestProfiler(
+            admin_token=admin_token, sample_rate=sample_rate, buffer_size=buffer_size
+        )
+    )
+
+
+def set_concurrency_limiter(target_latency: float, max_limit: int):
+    """
+    Limit the number of requests in flight, adapting the limit (up to
+    `max_limit`) to keep request latency under `target_latency` seconds.
+
+    """
+    concurrency_limiter.set(
+        AdaptiveConcurrencyLimiter(
+            initial_limit=min(20, max_limit),
+            max_limit=max_limit,
+            target_latency=target_latency,
+        )
+    )
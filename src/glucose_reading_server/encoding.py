@@ -0,0 +1,214 @@
+"""
+Content negotiation between JSON and MessagePack request/response bodies.
+
+MessagePack bodies are intended for embedded devices: UUIDs are encoded as
+16 raw bytes, values as decimal strings (to keep their precision) and
+timestamps as integer seconds since the Unix epoch. This requires
+`msgpack`, which can be installed with the `msgpack` extra.
+
+"""
+import datetime as dt
+import json
+from typing import Any, Dict, List, Optional, Sequence, Type
+from uuid import UUID
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+from pydantic import BaseModel  # pylint: disable=no-name-in-module
+
+from glucose_reading_store.models import GlucoseReading
+
+from .models import BatchGetRequest, ReadingCreateRequest
+from .profiling import phase
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+"""The media type of MessagePack bodies."""
+
+_MSGPACK_MEDIA_TYPES = {MSGPACK_MEDIA_TYPE, "application/x-msgpack"}
+_JSON_MEDIA_RANGES = {"application/json", "application/*", "*/*"}
+
+
+def _import_msgpack(status_code: int = 415) -> Any:
+    """
+    Import `msgpack`, raising an error with a status code (415 for request
+    bodies, or 406 for response bodies) if it isn't installed.
+
+    """
+    try:
+        import msgpack  # type: ignore  # pylint: disable=import-outside-toplevel
+    except ImportError as err:
+        raise HTTPException(
+            status_code=status_code, detail="MessagePack bodies are not supported."
+        ) from err
+    return msgpack
+
+
+def _media_type(header: Optional[str]) -> str:
+    """Get the media type from a content type header, without parameters."""
+    return (header or "").split(";")[0].strip().lower()
+
+
+def is_msgpack_request(request: Request) -> bool:
+    """Whether the request body is MessagePack."""
+    return _media_type(request.headers.get("content-type")) in _MSGPACK_MEDIA_TYPES
+
+
+def _quality(parameters: Sequence[str]) -> float:
+    """Get the quality factor (`q`) from the parameters of a media range."""
+    for parameter in parameters:
+        name, _, value = parameter.partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def wants_msgpack(request: Request) -> bool:
+    """
+    Whether the client would rather have a MessagePack response body than
+    JSON (i.e. MessagePack has the highest quality factor in `Accept`, or
+    comes first of the types with the highest quality).
+
+    """
+    best_quality, best_is_msgpack = 0.0, False
+    for media_range in request.headers.get("accept", "").split(","):
+        media_type, *parameters = media_range.split(";")
+        media_type = media_type.strip().lower()
+        if media_type in _MSGPACK_MEDIA_TYPES:
+            is_msgpack = True
+        elif media_type in _JSON_MEDIA_RANGES:
+            is_msgpack = False
+        else:
+            continue
+
+        quality = _quality(parameters)
+        if quality > best_quality:
+            best_quality, best_is_msgpack = quality, is_msgpack
+    return best_is_msgpack
+
+
+def check_acceptable(request: Request):
+    """
+    Raise a 406 error if the client wants a MessagePack response body and
+    `msgpack` isn't installed, before the request has any effects.
+
+    """
+    if wants_msgpack(request):
+        _import_msgpack(status_code=406)
+
+
+async def decode_body(request: Request) -> Any:
+    """
+    Decode a JSON or MessagePack request body, raising a 400 error if it
+    can't be decoded.
+
+    """
+    body = await request.body()
+    try:
+        if is_msgpack_request(request):
+            return _import_msgpack().unpackb(body, raw=False)
+        return json.loads(body)
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail="Invalid request body.") from err
+
+
+def reading_to_msgpack(reading: GlucoseReading) -> Dict[str, Any]:
+    """Convert a reading to a MessagePack-friendly dict."""
+    return {
+        "reading_uuid": reading.reading_uuid.bytes,
+        "patient_uuid": reading.patient_uuid.bytes,
+        "value": str(reading.value),
+        "unit": reading.unit,
+        "recorded_at": int(reading.recorded_at.astimezone(dt.timezone.utc).timestamp()),
+    }
+
+
+class MsgPackResponse(Response):
+    """A MessagePack response."""
+
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return _import_msgpack(status_code=406).packb(content, use_bin_type=True)
+
+
+def encode_reading(
+    request: Request,
+    reading: GlucoseReading,
+    status_code: int,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Encode a reading as a JSON or MessagePack response, as requested."""
+    with phase("encoding"):
+        if wants_msgpack(request):
+            return MsgPackResponse(
+                reading_to_msgpack(reading), status_code=status_code, headers=headers
+            )
+        return Response(
+            reading.json(),
+            status_code=status_code,
+            headers=headers,
+            media_type="application/json",
+        )
+
+
+def encode_batch_get_response(
+    request: Request, readings: List[GlucoseReading], missing: List[UUID]
+) -> Response:
+    """
+    Encode the result of a batch get as a JSON or MessagePack response, as
+    requested.
+
+    """
+    with phase("encoding"):
+        if wants_msgpack(request):
+            return MsgPackResponse(
+                {
+                    "readings": [reading_to_msgpack(reading) for reading in readings],
+                    "missing": [reading_uuid.bytes for reading_uuid in missing],
+                }
+            )
+        # Encode each reading as the single reading endpoints do, as pydantic
+        # doesn't use a nested model's JSON encoders (and the readings are
+        # already valid, so there's no need for a `BatchGetResponse`).
+        encoded_readings = ", ".join(reading.json() for reading in readings)
+        encoded_missing = json.dumps([str(reading_uuid) for reading_uuid in missing])
+        return Response(
+            f'{{"readings": [{encoded_readings}], "missing": {encoded_missing}}}',
+            media_type="application/json",
+        )
+
+
+async def decode_create_request(request: Request) -> ReadingCreateRequest:
+    """
+    Decode and validate a reading create request from a JSON or MessagePack
+    body. A pydantic `ValidationError` is raised if it's invalid.
+
+    """
+    body = await decode_body(request)
+    with phase("validation"):
+        return ReadingCreateRequest.parse_obj(body)
+
+
+def request_body_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    """The OpenAPI request body for a model sent as JSON or MessagePack."""
+    schema = {"schema": model.schema()}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": schema, MSGPACK_MEDIA_TYPE: schema},
+        }
+    }
+
+
+async def decode_batch_get_request(request: Request) -> BatchGetRequest:
+    """
+    Decode and validate a batch get request from a JSON or MessagePack body.
+    A pydantic `ValidationError` is raised if it's invalid.
+
+    """
+    body = await decode_body(request)
+    with phase("validation"):
+        return BatchGetRequest.parse_obj(body)
@@ -0,0 +1,87 @@
+"""
+A bounded, expiring store of idempotency keys, used to replay the result
+of a create request which has been retried by a client.
+
+"""
+from collections import OrderedDict
+import time
+from typing import NamedTuple, Optional, Tuple
+
+from glucose_reading_store.models import GlucoseReading
+
+from .models import ReadingCreateRequest
+
+
+class IdempotencyKeyReused(ValueError):
+    """Raised when an idempotency key is reused for a different request."""
+
+
+class IdempotentResult(NamedTuple):
+    """The request made with an idempotency key, and the resulting reading."""
+
+    create_request: ReadingCreateRequest
+    reading: GlucoseReading
+
+
+class IdempotencyKeyStore:
+    """
+    An in-memory store of idempotency keys which holds at most `max_size`
+    keys, each of which expire after `ttl` seconds. When the store is full
+    the least recently added key is evicted.
+
+    """
+
+    def __init__(self, max_size: int = 10_000, ttl: float = 24 * 60 * 60):
+        if max_size < 1:
+            raise ValueError("`max_size` must be at least 1.")
+        self._max_size = max_size
+        self._ttl = ttl
+        # Key to (expiry time, result), in order of insertion.
+        self._entries: "OrderedDict[str, Tuple[float, IdempotentResult]]" = (
+            OrderedDict()
+        )
+
+    def _evict_expired(self, now: float):
+        """Remove expired keys from the front of the store."""
+        while self._entries:
+            expires_at, _ = next(iter(self._entries.values()))
+            if expires_at > now:
+                break
+            self._entries.popitem(last=False)
+
+    def get(
+        self, key: str, create_request: ReadingCreateRequest
+    ) -> Optional[GlucoseReading]:
+        """
+        Get the reading created by a previous request with the same
+        idempotency key, if there is one. Raise an `IdempotencyKeyReused`
+        exception if the key was used for a different request.
+
+        """
+        self._evict_expired(time.monotonic())
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        _, result = entry
+        if result.create_request != create_request:
+            raise IdempotencyKeyReused(key)
+        return result.reading
+
+    def put(
+        self, key: str, create_request: ReadingCreateRequest, reading: GlucoseReading
+    ):
+        """Record the reading created by a request with an idempotency key."""
+        now = time.monotonic()
+        self._evict_expired(now)
+
+        self._entries.pop(key, None)
+        self._entries[key] = (
+            now + self._ttl,
+            IdempotentResult(create_request, reading),
+        )
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
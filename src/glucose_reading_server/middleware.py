@@ -0,0 +1,106 @@
+"""
+ASGI middleware which is only installed if it's enabled, so requests don't
+pay for features which are turned off.
+
+"""
+import time
+
+from typing import Optional
+
+from fastapi import FastAPI
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .admission import BULK_PRIORITY, request_priority
+from .dependencies import concurrency_limiter, request_profiler
+from .profiling import PROFILE_HEADER
+
+
+class ProfilingMiddleware:  # pylint: disable=too-few-public-methods
+    """
+    Profile requests which have an `X-Profile` header with the admin token,
+    or which are sampled, until their responses have been sent.
+
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        profiler = request_profiler.get()
+        if scope["type"] != "http" or not profiler.should_profile(
+            Headers(scope=scope).get(PROFILE_HEADER)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        with profiler.profile(scope["method"], scope["path"]) as profile:
+            await self.app(scope, receive, send_with_status)
+        profile.finish(status_code, time.perf_counter() - started)
+        profiler.record(profile)
+
+
+class ConcurrencyLimitMiddleware:  # pylint: disable=too-few-public-methods
+    """
+    Shed requests with a 503 if there are too many in flight (if a
+    concurrency limiter is set). Requests stay in flight until their
+    responses have been sent.
+
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        limiter = concurrency_limiter.get()
+        priority = (
+            request_priority(scope["method"], scope["path"])
+            if scope["type"] == "http"
+            else None
+        )
+        if limiter is None or priority is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not limiter.try_acquire(priority):
+            response = JSONResponse(
+                status_code=503,
+                content="Too many requests in flight.",
+                headers=limiter.retry_headers(),
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        latency: Optional[float] = None
+        try:
+            await self.app(scope, receive, send)
+            # Bulk requests take as long as they take, so they don't adjust
+            # the limit.
+            if priority != BULK_PRIORITY:
+                latency = time.perf_counter() - started
+        finally:
+            limiter.release(latency)
+
+
+def install_middleware(app: FastAPI):
+    """
+    Install the middleware which is enabled (i.e. profiling and concurrency
+    limiting) in an app.
+
+    """
+    if request_profiler.get().enabled:
+        app.add_middleware(ProfilingMiddleware)
+    # Shed requests before they're profiled.
+    if concurrency_limiter.get() is not None:
+        app.add_middleware(ConcurrencyLimitMiddleware)
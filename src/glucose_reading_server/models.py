@@ -1,10 +1,15 @@
 """Reading/update request models for the API."""
 from decimal import Decimal
-from typing import Literal, Optional
+from typing import List, Literal, Optional
 import datetime as dt
 from uuid import UUID
 
-from pydantic import BaseModel, validator  # pylint: disable=no-name-in-module
+from pydantic import BaseModel, Field, validator  # pylint: disable=no-name-in-module
+
+from glucose_reading_store.models import GlucoseReading
+
+MAX_BATCH_GET_SIZE = 1_000
+"""The maximum number of readings which can be fetched in one batch get."""
 
 
 class ReadingCreateRequest(BaseModel):  # pylint: disable=too-few-public-methods
@@ -44,3 +49,37 @@ class ReadingUpdateRequest(BaseModel):  # pylint: disable=too-few-public-methods
         if timestamp.tzinfo is None:
             raise ValueError("`recorded_at` must be TZ-aware.")
         return timestamp
+
+
+class ExportRequest(BaseModel):  # pylint: disable=too-few-public-methods
+    """A request to export readings in a columnar format."""
+
+    export_format: Literal["arrow", "parquet"] = "arrow"
+    patient_uuids: Optional[List[UUID]]
+    start: Optional[dt.datetime]
+    end: Optional[dt.datetime]
+
+    @validator("start", "end")
+    def assert_tz_aware(  # pylint: disable=no-self-use,no-self-argument
+        cls, timestamp: Optional[dt.datetime]
+    ) -> Optional[dt.datetime]:
+        """Make sure the start and end times are TZ-aware (if provided)."""
+        if timestamp is None:
+            return None
+
+        if timestamp.tzinfo is None:
+            raise ValueError("`start` and `end` must be TZ-aware.")
+        return timestamp
+
+
+class BatchGetRequest(BaseModel):  # pylint: disable=too-few-public-methods
+    """A request to fetch several readings from their UUIDs."""
+
+    reading_uuids: List[UUID] = Field(..., max_items=MAX_BATCH_GET_SIZE)
+
+
+class BatchGetResponse(BaseModel):  # pylint: disable=too-few-public-methods
+    """The readings found by a batch get, and the UUIDs of any missing readings."""
+
+    readings: List[GlucoseReading]
+    missing: List[UUID]
@@ -0,0 +1,262 @@
+"""
+Opt-in profiling of requests.
+
+A request is profiled if it has an `X-Profile` header matching the admin
+token, or if it's picked by the sampling rate. Profiled requests record a
+call profile, the time spent in each phase of handling the request and the
+time taken by each SQL statement. The slowest profiled requests are kept
+so they can be fetched from an admin endpoint.
+
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import cProfile
+import datetime as dt
+import heapq
+import hmac
+import io
+import itertools
+import pstats
+import random
+import time
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROFILE_HEADER = "X-Profile"
+"""The header which requests profiling (its value must be the admin token)."""
+
+PROFILED_FUNCTIONS = {
+    "from_reading": ("glucose_reading_store/stores/sqlalchemy.py", "from_reading"),
+    "to_reading": (
+        "glucose_reading_store/stores/sqlalchemy.py",
+        "_reading_from_columns",
+    ),
+    "flush": ("sqlalchemy/orm/session.py", "flush"),
+    "serialize_response": ("fastapi/routing.py", "serialize_response"),
+}
+"""
+Phases which are timed from the call profile, as the file and name of the
+function which implements them.
+
+"""
+
+
+class SQLTiming(NamedTuple):
+    """The time taken by a SQL statement."""
+
+    statement: str
+    duration: float
+
+
+class RequestProfile:  # pylint: disable=too-many-instance-attributes
+    """The profile of a single request, as it's being recorded."""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started_at = dt.datetime.now(dt.timezone.utc)
+        self.status_code: Optional[int] = None
+        self.duration = 0.0
+        self.phases: Dict[str, float] = {}
+        self.sql: List[SQLTiming] = []
+        self.profilers: List[cProfile.Profile] = []
+        self.call_profile: Optional[str] = None
+
+    def add_phase_time(self, name: str, duration: float):
+        """Add time spent in a phase of handling the request."""
+        self.phases[name] = self.phases.get(name, 0.0) + duration
+
+    def finish(self, status_code: int, duration: float, max_functions: int = 30):
+        """
+        Record the result of the request, and merge the call profiles from
+        each thread used by the request.
+
+        """
+        self.status_code = status_code
+        self.duration = duration
+        if not self.profilers:
+            return
+
+        output = io.StringIO()
+        stats = pstats.Stats(*self.profilers, stream=output)
+        self.profilers = []
+
+        for name, (filename, function) in PROFILED_FUNCTIONS.items():
+            cumulative = sum(
+                func_stats[3]
+                for (func_file, _, func_name), func_stats in stats.stats.items()  # type: ignore
+                if func_name == function and func_file.endswith(filename)
+            )
+            if cumulative:
+                self.add_phase_time(name, cumulative)
+
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(max_functions)
+        self.call_profile = output.getvalue()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the profile to a JSON-friendly dict."""
+        return {
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at.isoformat(),
+            "status_code": self.status_code,
+            "duration": self.duration,
+            "phases": self.phases,
+            "sql": [timing._asdict() for timing in self.sql],
+            "call_profile": self.call_profile,
+        }
+
+
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar(
+    "current_profile", default=None
+)
+
+
+def _start_profiler() -> Optional[cProfile.Profile]:
+    """
+    Start a call profiler for the current thread, or return `None` if one
+    can't be started (e.g. another profiler is already active).
+
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time a phase of handling the request, if the request is being profiled."""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_phase_time(name, time.perf_counter() - started)
+
+
+@contextmanager
+def profile_thread() -> Iterator[None]:
+    """
+    Record a call profile of work run in a worker thread on behalf of a
+    profiled request (the request's call profile only covers its own thread).
+
+    """
+    profile = _current_profile.get()
+    profiler = None if profile is None else _start_profiler()
+    try:
+        yield
+    finally:
+        if profile is not None and profiler is not None:
+            profiler.disable()
+            profile.profilers.append(profiler)
+
+
+def _before_cursor_execute(conn: Any, *_: Any):
+    """Record when a statement started, if the request is being profiled."""
+    if _current_profile.get() is not None:
+        conn.info.setdefault("profiling_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn: Any, _cursor: Any, statement: str, *_: Any):
+    """Record the time taken by a statement, if the request is being profiled."""
+    profile = _current_profile.get()
+    started = conn.info.get("profiling_started")
+    if profile is not None and started:
+        profile.sql.append(SQLTiming(statement, time.perf_counter() - started.pop()))
+
+
+def instrument_engine(engine: Engine):
+    """Record the time taken by SQL statements run by profiled requests."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class RequestProfiler:
+    """
+    Decides which requests to profile, and keeps the `buffer_size` slowest
+    profiled requests.
+
+    """
+
+    def __init__(
+        self,
+        admin_token: Optional[str] = None,
+        sample_rate: float = 0.0,
+        buffer_size: int = 20,
+    ):
+        self.admin_token = admin_token
+        self.sample_rate = sample_rate
+        self.buffer_size = buffer_size
+        # A min-heap of (duration, order, profile), so the fastest of the
+        # slowest requests is replaced first.
+        self._slowest: List[Tuple[float, int, RequestProfile]] = []
+        self._order = itertools.count()
+        self._profiling = False
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any requests can be profiled."""
+        return self.admin_token is not None or self.sample_rate > 0
+
+    def is_admin_token(self, token: Optional[str]) -> bool:
+        """
+        Whether a token is the admin token (compared in constant time, so the
+        admin token can't be guessed from how long a comparison takes).
+
+        """
+        if token is None or self.admin_token is None:
+            return False
+        return hmac.compare_digest(token.encode(), self.admin_token.encode())
+
+    def should_profile(self, profile_header: Optional[str]) -> bool:
+        """Whether a request should be profiled."""
+        if profile_header is not None and self.admin_token is not None:
+            return self.is_admin_token(profile_header)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @contextmanager
+    def profile(self, method: str, path: str) -> Iterator[RequestProfile]:
+        """
+        Profile the handling of a request. Only one call profile can be
+        recorded at once in the event loop's thread (and it includes any
+        other requests handled at the same time), so concurrent profiled
+        requests only record their phase and SQL timings.
+
+        """
+        profile = RequestProfile(method, path)
+        token = _current_profile.set(profile)
+
+        profiler: Optional[cProfile.Profile] = None
+        if not self._profiling:
+            profiler = _start_profiler()
+            self._profiling = profiler is not None
+
+        try:
+            yield profile
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profile.profilers.append(profiler)
+                self._profiling = False
+            _current_profile.reset(token)
+
+    def record(self, profile: RequestProfile):
+        """Keep a finished profile, if it's one of the slowest requests."""
+        entry = (profile.duration, next(self._order), profile)
+        if len(self._slowest) < self.buffer_size:
+            heapq.heappush(self._slowest, entry)
+        elif self._slowest and profile.duration > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self) -> List[RequestProfile]:
+        """The slowest profiled requests, slowest first."""
+        return [profile for _, _, profile in sorted(self._slowest, reverse=True)]
@@ -0,0 +1,108 @@
+"""
+Single-flight coalescing of identical concurrent store reads.
+
+If a read is requested while an identical read (i.e. one with the same key)
+is already in flight, the request waits for and shares the result of the
+in-flight read instead of querying the store again. Writes forget the keys
+they affect, so reads which start after a write never share a result read
+before it.
+
+"""
+import asyncio
+from typing import Any, Callable, Dict, Hashable, NamedTuple, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+T = TypeVar("T")  # pylint: disable=invalid-name
+
+
+class SingleFlightMetrics(NamedTuple):
+    """Counts of the reads handled by a single-flight group."""
+
+    requests: int
+    """The number of reads requested."""
+    executions: int
+    """The number of reads which were run against the store."""
+    coalesced: int
+    """The number of reads which shared the result of an in-flight read."""
+    invalidations: int
+    """The number of in-flight reads forgotten because of a write."""
+    in_flight: int
+    """The number of reads currently in flight."""
+
+
+class SingleFlight:
+    """
+    A group of in-flight reads, keyed by a hashable description of the read
+    (e.g. `("reading", reading_uuid)`).
+
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self._requests = 0
+        self._executions = 0
+        self._coalesced = 0
+        self._invalidations = 0
+
+    async def do(self, key: Hashable, func: Callable[[], T]) -> T:
+        """
+        Run the blocking function `func` in a worker thread and return its
+        result, unless a read with the same key is in flight, in which case
+        its result (or exception) is shared.
+
+        """
+        self._requests += 1
+        call = self._calls.get(key)
+        if call is None:
+            self._executions += 1
+            new_call = asyncio.ensure_future(run_in_threadpool(func))
+            self._calls[key] = new_call
+            new_call.add_done_callback(lambda _: self._finish(key, new_call))
+            call = new_call
+        else:
+            self._coalesced += 1
+        # Shield the call so one caller being cancelled doesn't cancel it for
+        # the others.
+        return await asyncio.shield(call)
+
+    def _finish(self, key: Hashable, call: "asyncio.Future[Any]"):
+        """Forget a finished read, unless it's already been forgotten."""
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def forget(self, *keys: Hashable):
+        """
+        Forget the in-flight reads with some keys (e.g. after a write), so
+        later reads query the store again.
+
+        """
+        for key in keys:
+            if self._calls.pop(key, None) is not None:
+                self._invalidations += 1
+
+    def forget_kind(self, kind: Hashable):
+        """
+        Forget the in-flight reads with keys of a kind, i.e. tuple keys whose
+        first item is `kind` (e.g. after a write whose exact keys aren't
+        known).
+
+        """
+        self.forget(
+            *[
+                key
+                for key in self._calls
+                if isinstance(key, tuple) and key and key[0] == kind
+            ]
+        )
+
+    @property
+    def metrics(self) -> SingleFlightMetrics:
+        """Counts of the reads handled so far."""
+        return SingleFlightMetrics(
+            self._requests,
+            self._executions,
+            self._coalesced,
+            self._invalidations,
+            len(self._calls),
+        )
@@ -2,13 +2,40 @@
 A package to track glucose readings from diabetes patients in a
 data store.
 
+The public names are imported lazily (on first access), so importing part
+of the package doesn't import SQLAlchemy, pyarrow etc. unless they're used.
+
 """
+from typing import TYPE_CHECKING
+
+from .common import lazy_importer
+
 __version__ = "0.0.1"
 
-from .exceptions import DuplicateReading, NoSuchReading, NotInContext
-from .models import GlucoseReading
-from .stores import (
-    AbstractGlucoseReadingStore,
-    FakeGlucoseReadingStore,
-    SQLAlchemyGlucoseReadingStore,
-)
+_LAZY_IMPORTS = {
+    "ReadingArchive": ".archive",
+    "DuplicateReading": ".exceptions",
+    "NoSuchReading": ".exceptions",
+    "NotInContext": ".exceptions",
+    "GlucoseReading": ".models",
+    "ReadingRecord": ".records",
+    "AbstractGlucoseReadingStore": ".stores",
+    "FakeGlucoseReadingStore": ".stores",
+    "SQLAlchemyGlucoseReadingStore": ".stores",
+}
+
+__all__ = ["__version__", *_LAZY_IMPORTS]
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .archive import ReadingArchive
+    from .exceptions import DuplicateReading, NoSuchReading, NotInContext
+    from .models import GlucoseReading
+    from .records import ReadingRecord
+    from .stores import (
+        AbstractGlucoseReadingStore,
+        FakeGlucoseReadingStore,
+        SQLAlchemyGlucoseReadingStore,
+    )
+
+
+__getattr__, __dir__ = lazy_importer(__name__, _LAZY_IMPORTS)
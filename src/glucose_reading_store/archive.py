@@ -0,0 +1,318 @@
+"""
+A read-only archive of cold glucose readings, stored in compressed Parquet
+files partitioned by the month the readings were recorded in.
+
+Each file written to the archive is recorded in an index alongside the
+earliest and latest time a reading in the file was recorded (and its
+lowest and highest reading UUID), so queries for a range of times (or for
+readings by UUID) only need to read the files which overlap it.
+
+These require `pyarrow`, which can be installed with the `export` extra.
+
+"""
+import datetime as dt
+import json
+import os
+from pathlib import Path
+from typing import Any, Collection, Dict, Iterator, List, Optional, Tuple, Union
+from uuid import UUID, uuid4
+
+from .common import import_pyarrow, parse_uuid
+from .exceptions import NoSuchReading
+from .export import reading_schema
+from .models import GlucoseReading
+from .stores.base import READING_COLUMNS, ReadingColumns
+
+INDEX_FILENAME = "index.json"
+"""The name of the archive's index file."""
+
+
+def _as_utc(timestamp: dt.datetime) -> dt.datetime:
+    """Make a (naive UTC or TZ-aware) timestamp TZ-aware in UTC."""
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=dt.timezone.utc)
+    return timestamp.astimezone(dt.timezone.utc)
+
+
+class ReadingArchive:
+    """
+    An archive of readings in the directory `directory`. Readings can be
+    added to the archive but not modified or removed.
+
+    """
+
+    def __init__(self, directory: Union[str, Path], row_group_size: int = 65_536):
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._row_group_size = row_group_size
+        self._index: List[Dict[str, Any]] = []
+        self._index_mtime: Optional[float] = None
+
+    @property
+    def _index_path(self) -> Path:
+        return self._directory / INDEX_FILENAME
+
+    def _partitions(
+        self, start: Optional[dt.datetime] = None, end: Optional[dt.datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        The index entries of the archive files which may contain readings
+        recorded from `start` (inclusive) until `end` (exclusive), newest
+        first.
+
+        """
+        # The index may have been updated by another process (e.g. the
+        # retention job), so reload it if it's changed.
+        try:
+            mtime = self._index_path.stat().st_mtime
+        except FileNotFoundError:
+            return []
+        if mtime != self._index_mtime:
+            with open(self._index_path, encoding="utf-8") as file:
+                self._index = json.load(file)["partitions"]
+            self._index_mtime = mtime
+
+        # The index holds ISO-8601 timestamps in UTC, which sort correctly.
+        start_iso = start and _as_utc(start).isoformat(timespec="microseconds")
+        end_iso = end and _as_utc(end).isoformat(timespec="microseconds")
+
+        partitions = []
+        for partition in self._index:
+            if start_iso is not None and partition["max_recorded_at"] < start_iso:
+                continue
+            if end_iso is not None and partition["min_recorded_at"] >= end_iso:
+                continue
+            partitions.append(partition)
+        return partitions[::-1]
+
+    def _partitions_with_uuids(
+        self, reading_uuids: Collection[str]
+    ) -> Iterator[Tuple[Dict[str, Any], List[str]]]:
+        """
+        The index entries of the archive files which may contain readings
+        with some UUIDs (as strings), newest first, with the UUIDs which may
+        be in each file.
+
+        """
+        for partition in self._partitions():
+            # Files archived before the UUID range was recorded may hold any
+            # UUID.
+            min_uuid = partition.get("min_reading_uuid", "")
+            max_uuid = partition.get("max_reading_uuid", "~")
+            candidates = [
+                reading_uuid
+                for reading_uuid in reading_uuids
+                if min_uuid <= reading_uuid <= max_uuid
+            ]
+            if candidates:
+                yield partition, candidates
+
+    def _read(self, partition: Dict[str, Any], filters: List[Any]) -> Any:
+        """Read the readings matching some filters from an archive file."""
+        pq = import_pyarrow().parquet
+        return pq.read_table(
+            self._directory / partition["path"],
+            schema=reading_schema(),
+            filters=filters or None,
+        )
+
+    def add_reading_columns(self, columns: ReadingColumns) -> int:
+        """
+        Add a chunk of reading columns to the archive, returning the number
+        of readings added.
+
+        """
+        pa = import_pyarrow()
+        table = pa.Table.from_pydict(
+            {name: columns[name] for name in READING_COLUMNS}, schema=reading_schema()
+        )
+        if table.num_rows == 0:
+            return 0
+
+        # pylint: disable=no-member
+        months = pa.compute.strftime(table["recorded_at"], format="%Y-%m")
+        new_partitions = []
+        for month in pa.compute.unique(months).to_pylist():
+            # Sort by reading UUID so row group statistics can be used to skip
+            # row groups when fetching a reading from the archive.
+            partition_table = table.filter(pa.compute.equal(months, month)).sort_by(
+                "reading_uuid"
+            )
+            reading_uuids = partition_table["reading_uuid"]
+            path = Path(month, f"{uuid4().hex}.parquet")
+            (self._directory / month).mkdir(exist_ok=True)
+            # Write the file atomically, so an interrupted write never leaves
+            # a partial file in the archive.
+            temp_path = self._directory / path.with_suffix(".tmp")
+            pa.parquet.write_table(
+                partition_table,
+                temp_path,
+                compression="zstd",
+                row_group_size=self._row_group_size,
+            )
+            os.replace(temp_path, self._directory / path)
+
+            recorded_at = partition_table["recorded_at"]
+            new_partitions.append(
+                {
+                    "path": path.as_posix(),
+                    "min_recorded_at": _as_utc(
+                        pa.compute.min(recorded_at).as_py()
+                    ).isoformat(timespec="microseconds"),
+                    "max_recorded_at": _as_utc(
+                        pa.compute.max(recorded_at).as_py()
+                    ).isoformat(timespec="microseconds"),
+                    "min_reading_uuid": reading_uuids[0].as_py(),
+                    "max_reading_uuid": reading_uuids[-1].as_py(),
+                    "num_readings": partition_table.num_rows,
+                }
+            )
+
+        # Write the index atomically, so readers never see a partial index.
+        index = self._partitions() + new_partitions
+        index.sort(key=lambda partition: partition["min_recorded_at"])
+        temp_path = self._index_path.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"partitions": index}, file, indent=2)
+        os.replace(temp_path, self._index_path)
+
+        return table.num_rows
+
+    def get_reading(self, reading_uuid: Union[int, str, UUID]) -> GlucoseReading:
+        """
+        Fetch an archived reading from its UUID, raising a `NoSuchReading`
+        exception if the reading is not in the archive.
+
+        """
+        reading_uuid = parse_uuid(reading_uuid)
+        for partition, _ in self._partitions_with_uuids([str(reading_uuid)]):
+            rows = self._read(
+                partition, [("reading_uuid", "==", str(reading_uuid))]
+            ).to_pylist()
+            if rows:
+                return self._to_reading(rows[0])
+        raise NoSuchReading(repr(reading_uuid))
+
+    def get_readings(
+        self, reading_uuids: Collection[Union[int, str, UUID]]
+    ) -> Dict[UUID, GlucoseReading]:
+        """
+        Fetch several archived readings from their UUIDs, as a mapping of
+        reading UUID to reading. Readings not in the archive are left out.
+
+        """
+        remaining = {str(parse_uuid(uuid)) for uuid in reading_uuids}
+        readings = {}
+        for partition, candidates in self._partitions_with_uuids(sorted(remaining)):
+            candidates = [uuid for uuid in candidates if uuid in remaining]
+            if not candidates:
+                continue
+            rows = self._read(
+                partition, [("reading_uuid", "in", candidates)]
+            ).to_pylist()
+            for row in rows:
+                reading = self._to_reading(row)
+                readings[reading.reading_uuid] = reading
+                remaining.discard(row["reading_uuid"])
+        return readings
+
+    def find_reading(
+        self, patient_uuid: Union[int, str, UUID], recorded_at: dt.datetime
+    ) -> GlucoseReading:
+        """
+        Fetch an archived reading from its patient UUID and recording time,
+        raising a `NoSuchReading` exception if the reading is not in the
+        archive.
+
+        """
+        natural_key = (parse_uuid(patient_uuid), _as_utc(recorded_at))
+        try:
+            return self.find_readings([natural_key])[natural_key]
+        except KeyError as err:
+            raise NoSuchReading(repr(natural_key)) from err
+
+    def find_readings(
+        self,
+        natural_keys: Collection[Tuple[Union[int, str, UUID], dt.datetime]],
+    ) -> Dict[Tuple[UUID, dt.datetime], GlucoseReading]:
+        """
+        Fetch several archived readings from their patient UUIDs and
+        recording times, as a mapping of (patient UUID, recording time in
+        UTC) to reading. Readings not in the archive are left out.
+
+        """
+        keys = {
+            (parse_uuid(patient_uuid), _as_utc(recorded_at))
+            for patient_uuid, recorded_at in natural_keys
+        }
+        if not keys:
+            return {}
+
+        start = min(recorded_at for _, recorded_at in keys)
+        end = max(recorded_at for _, recorded_at in keys)
+        end += dt.timedelta(microseconds=1)
+        filters = [
+            ("patient_uuid", "in", {str(patient_uuid) for patient_uuid, _ in keys}),
+            ("recorded_at", ">=", start),
+            ("recorded_at", "<", end),
+        ]
+        readings: Dict[Tuple[UUID, dt.datetime], GlucoseReading] = {}
+        for partition in self._partitions(start, end):
+            for row in self._read(partition, filters).to_pylist():
+                reading = self._to_reading(row)
+                key = (reading.patient_uuid, reading.recorded_at)
+                if key in keys:
+                    readings.setdefault(key, reading)
+        return readings
+
+    def iterate_reading_columns(
+        self,
+        patient_uuids: Optional[Collection[Union[int, str, UUID]]] = None,
+        start: Optional[dt.datetime] = None,
+        end: Optional[dt.datetime] = None,
+        chunk_size: int = 10_000,
+    ) -> Iterator[ReadingColumns]:
+        """
+        Iterate through chunks of archived readings as columns, in the same
+        way as `AbstractGlucoseReadingStore.iterate_reading_columns`.
+
+        """
+        filters: List[Any] = []
+        if patient_uuids is not None:
+            filters.append(
+                (
+                    "patient_uuid",
+                    "in",
+                    {str(parse_uuid(uuid)) for uuid in patient_uuids},
+                )
+            )
+        if start is not None:
+            filters.append(("recorded_at", ">=", _as_utc(start)))
+        if end is not None:
+            filters.append(("recorded_at", "<", _as_utc(end)))
+
+        for partition in self._partitions(start, end):
+            for batch in self._read(partition, filters).to_batches(chunk_size):
+                columns = batch.to_pydict()
+                columns["recorded_at"] = [
+                    timestamp.astimezone(dt.timezone.utc).replace(tzinfo=None)
+                    for timestamp in columns["recorded_at"]
+                ]
+                yield columns
+
+    def iterate_readings(self) -> Iterator[GlucoseReading]:
+        """Iterate through all the readings in the archive."""
+        for partition in self._partitions():
+            for row in self._read(partition, []).to_pylist():
+                yield self._to_reading(row)
+
+    @staticmethod
+    def _to_reading(row: Dict[str, Any]) -> GlucoseReading:
+        """Create a glucose reading from an archived row."""
+        return GlucoseReading(
+            reading_uuid=row["reading_uuid"],
+            patient_uuid=row["patient_uuid"],
+            value=row["value"],
+            unit=row["unit"],
+            recorded_at=row["recorded_at"].astimezone(dt.timezone.utc),
+        )
@@ -0,0 +1,292 @@
+"""
+Bulk imports of glucose readings from CSV or newline-delimited JSON files,
+e.g. to backfill historical readings.
+
+Readings are validated in batches (optionally in a pool of worker
+processes) and each batch is added to the store in a single insert. The
+number of rows imported from each file can be recorded in a checkpoint
+file, so an interrupted import can be resumed.
+
+"""
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import csv
+import json
+import os
+from pathlib import Path
+import time
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+from uuid import UUID, uuid5
+
+from .exceptions import DuplicateReading
+from .models import GlucoseReading
+from .records import ReadingRecord, to_epoch_micros
+from .stores.base import AbstractGlucoseReadingStore
+
+IMPORT_FORMATS = ("csv", "ndjson")
+"""The supported import formats."""
+
+_IMPORT_FILE_EXTENSIONS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+_READING_NAMESPACE = UUID("2c5f4e0a-63a8-4b1c-9d0e-8f0b6f1f3a57")
+"""The namespace for reading UUIDs derived from the content of a reading."""
+
+
+class InvalidRow(ValueError):
+    """Raised when a row of an import file is not a valid reading."""
+
+
+class ImportProgress(NamedTuple):
+    """The progress of an import from a file."""
+
+    path: str
+    rows_read: int
+    """The number of rows read from the file, including any skipped rows."""
+    rows_imported: int
+    rows_skipped: int
+    """The number of invalid or duplicate rows which were skipped."""
+    elapsed: float
+    """The number of seconds the import has taken."""
+
+    @property
+    def rows_per_second(self) -> float:
+        """The rate rows have been imported or skipped in this run."""
+        rows = self.rows_imported + self.rows_skipped
+        return rows / self.elapsed if self.elapsed else 0.0
+
+
+class _Batch(NamedTuple):
+    """A batch of unvalidated rows from an import file."""
+
+    import_format: str
+    first_row: int
+    header: Optional[List[str]]
+    rows: List[Any]
+
+
+def _reading_from_record(record: Dict[str, Any]) -> GlucoseReading:
+    """
+    Create a reading from a record. If the record has no reading UUID, one
+    is derived from the reading's content, so that importing the same
+    reading twice raises a `DuplicateReading` error.
+
+    """
+    if not record.get("reading_uuid"):
+        record = {key: value for key, value in record.items() if key != "reading_uuid"}
+        reading = GlucoseReading(**record)
+        content = "|".join(
+            [
+                str(reading.patient_uuid),
+                # The same instant may be given in different timezones.
+                str(to_epoch_micros(reading.recorded_at)),
+                str(reading.value),
+                reading.unit,
+            ]
+        )
+        return reading.copy(update={"reading_uuid": uuid5(_READING_NAMESPACE, content)})
+    return GlucoseReading(**record)
+
+
+def _validate_batch(
+    batch: _Batch, skip_invalid: bool
+) -> Tuple[List[ReadingRecord], int]:
+    """
+    Validate a batch of rows, returning records of the readings and the
+    number of rows skipped. This runs in a worker process if a pool is
+    used, and records are much cheaper to send back than readings.
+
+    """
+    records = []
+    skipped = 0
+    for row_number, row in enumerate(batch.rows, start=batch.first_row):
+        try:
+            if batch.import_format == "csv":
+                record = dict(zip(batch.header or [], row))
+            else:
+                if not row.strip():
+                    skipped += 1
+                    continue
+                record = json.loads(row)
+            records.append(ReadingRecord.from_reading(_reading_from_record(record)))
+        # Pydantic's `ValidationError` is a `ValueError`.
+        except (AttributeError, TypeError, ValueError) as err:
+            if not skip_invalid:
+                raise InvalidRow(f"Invalid reading in row {row_number}: {err}") from err
+            skipped += 1
+    return records, skipped
+
+
+def _iterate_batches(
+    path: Path, import_format: str, batch_size: int, skip_rows: int
+) -> Iterator[_Batch]:
+    """
+    Split the rows of a file into batches, skipping the first `skip_rows`
+    rows (e.g. those which were imported before an import was interrupted).
+
+    """
+    with open(path, encoding="utf-8", newline="") as file:
+        header: Optional[List[str]] = None
+        rows: Iterator[Any] = iter(file)
+        if import_format == "csv":
+            rows = csv.reader(file)
+            header = next(rows, [])
+
+        row_number = 0
+        batch: List[Any] = []
+        for row in rows:
+            row_number += 1
+            if row_number <= skip_rows:
+                continue
+
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield _Batch(import_format, row_number - len(batch) + 1, header, batch)
+                batch = []
+
+        if batch:
+            yield _Batch(import_format, row_number - len(batch) + 1, header, batch)
+
+
+def _validate_batches(
+    batches: Iterator[_Batch], skip_invalid: bool, workers: int
+) -> Iterator[Tuple[_Batch, List[ReadingRecord], int]]:
+    """
+    Validate batches in order, using a pool of `workers` processes if there
+    is more than one worker. Only a few batches are queued per worker, so
+    large files aren't read into memory.
+
+    """
+    if workers <= 1:
+        for batch in batches:
+            records, skipped = _validate_batch(batch, skip_invalid)
+            yield batch, records, skipped
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: Deque[Tuple[_Batch, Future]] = deque()
+        for batch in batches:
+            pending.append(
+                (batch, executor.submit(_validate_batch, batch, skip_invalid))
+            )
+            if len(pending) >= 2 * workers:
+                queued_batch, future = pending.popleft()
+                records, skipped = future.result()
+                yield queued_batch, records, skipped
+
+        while pending:
+            queued_batch, future = pending.popleft()
+            records, skipped = future.result()
+            yield queued_batch, records, skipped
+
+
+def _read_checkpoint(checkpoint_path: Optional[Path]) -> Dict[str, int]:
+    """Read the number of rows imported from each file from a checkpoint."""
+    if checkpoint_path is None or not checkpoint_path.exists():
+        return {}
+    with open(checkpoint_path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _write_checkpoint(checkpoint_path: Path, checkpoint: Dict[str, int]):
+    """Write a checkpoint atomically, so it's never left half-written."""
+    temp_path = checkpoint_path.with_suffix(".tmp")
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(checkpoint, file, indent=2)
+    os.replace(temp_path, checkpoint_path)
+
+
+def _add_batch(
+    store: AbstractGlucoseReadingStore, records: Sequence[ReadingRecord]
+) -> int:
+    """
+    Add a batch of readings to the store, returning the number of duplicate
+    readings skipped. Readings already in the store (e.g. when resuming an
+    import) are skipped without adding the readings one by one. If the
+    batch still clashes with the store (e.g. a reading for a patient at the
+    same time as another reading), fall back to adding them one by one.
+
+    """
+    try:
+        with store:
+            return store.add_new_records(records)
+    except DuplicateReading:
+        pass
+
+    duplicates = 0
+    for record in records:
+        try:
+            with store:
+                store.add_record(record)
+        except DuplicateReading:
+            duplicates += 1
+    return duplicates
+
+
+def import_readings(  # pylint: disable=too-many-arguments,too-many-locals
+    store: AbstractGlucoseReadingStore,
+    path: Union[str, Path],
+    import_format: Optional[str] = None,
+    batch_size: int = 5_000,
+    workers: int = 1,
+    checkpoint_path: Optional[Union[str, Path]] = None,
+    skip_invalid: bool = False,
+    progress: Optional[Callable[[ImportProgress], None]] = None,
+) -> ImportProgress:
+    """
+    Import readings from a CSV (with a header row) or newline-delimited JSON
+    file into a store, returning the final progress of the import.
+
+    Columns/keys are the fields of `GlucoseReading`; `reading_uuid` is
+    optional. If `skip_invalid` is not set, an `InvalidRow` exception is
+    raised for the first invalid row. If a `checkpoint_path` is given, rows
+    imported by a previous run are skipped. `progress` is called after each
+    batch is added to the store.
+
+    """
+    path = Path(path)
+    if import_format is None:
+        try:
+            import_format = _IMPORT_FILE_EXTENSIONS[path.suffix.lower()]
+        except KeyError as err:
+            raise ValueError(f"Can't infer import format of {str(path)!r}") from err
+    if import_format not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported import format: {import_format!r}")
+
+    checkpoint_path = None if checkpoint_path is None else Path(checkpoint_path)
+    checkpoint = _read_checkpoint(checkpoint_path)
+    checkpoint_key = str(path.resolve())
+    rows_read = checkpoint.get(checkpoint_key, 0)
+
+    started = time.perf_counter()
+    current_progress = ImportProgress(str(path), rows_read, 0, 0, 0.0)
+    batches = _iterate_batches(path, import_format, batch_size, rows_read)
+    for batch, records, skipped in _validate_batches(batches, skip_invalid, workers):
+        duplicates = _add_batch(store, records)
+
+        rows_read += len(batch.rows)
+        current_progress = ImportProgress(
+            str(path),
+            rows_read,
+            current_progress.rows_imported + len(records) - duplicates,
+            current_progress.rows_skipped + skipped + duplicates,
+            time.perf_counter() - started,
+        )
+        if checkpoint_path is not None:
+            checkpoint[checkpoint_key] = rows_read
+            _write_checkpoint(checkpoint_path, checkpoint)
+        if progress is not None:
+            progress(current_progress)
+
+    return current_progress
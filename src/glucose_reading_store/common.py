@@ -3,9 +3,20 @@ Service layer code which might be required by multiple components.
 
 """
 import datetime as dt
-from typing import Union
+from importlib import import_module
+from importlib.util import find_spec
+import sys
+from typing import Any, Callable, Dict, List, Tuple, Union
 from uuid import UUID
 
+SCHEMA_MODES = ("create", "verify", "skip")
+"""
+How a database store prepares its schema: create (or update) it if it
+isn't the current version, raise a `SchemaNotReady` exception if it isn't
+the current version, or assume it's ready.
+
+"""
+
 
 def parse_uuid(uuid_value: Union[int, str, UUID]) -> UUID:
     """Parse a UUID from a string or int, if necessary."""
@@ -30,3 +41,51 @@ def format_as_tz_aware_iso(datetime: dt.datetime) -> str:
     if datetime.tzinfo is None:  # pragma: no-cover
         datetime = datetime.astimezone(dt.timezone.utc)
     return datetime.replace(microsecond=0).isoformat()
+
+
+def import_pyarrow() -> Any:
+    """Import `pyarrow`, raising a helpful error if it isn't installed."""
+    try:
+        import pyarrow  # type: ignore  # pylint: disable=import-outside-toplevel
+        import pyarrow.compute  # type: ignore  # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet  # type: ignore  # pylint: disable=import-outside-toplevel
+    except ImportError as err:
+        raise ImportError(
+            "Columnar exports and archives require 'pyarrow'. Install it with "
+            + "`pip install 'glucose-reading-store[export]'`"
+        ) from err
+    return pyarrow
+
+
+def lazy_importer(
+    package: str, lazy_imports: Dict[str, str]
+) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """
+    Make the module `__getattr__` and `__dir__` functions (PEP 562) of a
+    package, which import its public names (mapped to the relative modules
+    which define them) on first access. Submodules of the package which
+    haven't been imported yet are also imported on first access, as they
+    were when the package imported them eagerly.
+
+    """
+    namespace = vars(sys.modules[package])
+
+    def __getattr__(name: str) -> Any:
+        try:
+            module_name = lazy_imports[name]
+        except KeyError as err:
+            submodule_name = f"{package}.{name}"
+            if not name.startswith("__") and find_spec(submodule_name) is not None:
+                return import_module(submodule_name)
+            raise AttributeError(
+                f"module {package!r} has no attribute {name!r}"
+            ) from err
+
+        value = getattr(import_module(module_name, package), name)
+        namespace[name] = value
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(namespace) | set(lazy_imports))
+
+    return __getattr__, __dir__
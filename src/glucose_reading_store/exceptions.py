@@ -11,3 +11,7 @@ class NoSuchReading(KeyError):
 
 class NotInContext(ValueError):
     """Raised when context managers are accessed outside the context."""
+
+
+class SchemaNotReady(RuntimeError):
+    """Raised when the database schema is missing or the wrong version."""
@@ -0,0 +1,131 @@
+"""
+Columnar (Apache Arrow/Parquet) exports of glucose readings.
+
+These require `pyarrow`, which can be installed with the `export` extra.
+
+"""
+import datetime as dt
+from typing import Any, Collection, Iterator, List, Optional, Union
+from uuid import UUID
+
+from .common import import_pyarrow
+from .stores.base import AbstractGlucoseReadingStore, ReadingColumns
+
+EXPORT_FORMATS = ("arrow", "parquet")
+"""The supported export formats."""
+
+EXPORT_MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+"""The media types of the export formats."""
+
+EXPORT_FILE_EXTENSIONS = {"arrow": "arrows", "parquet": "parquet"}
+"""The file extensions of the export formats."""
+
+
+def check_export_available():
+    """Raise an `ImportError` if exports are not available."""
+    import_pyarrow()
+
+
+def reading_schema() -> Any:
+    """The Arrow schema of exported readings."""
+    pa = import_pyarrow()
+    return pa.schema(
+        [
+            ("reading_uuid", pa.string()),
+            ("patient_uuid", pa.string()),
+            # Keep values as strings to maintain their precision.
+            ("value", pa.string()),
+            ("unit", pa.string()),
+            ("recorded_at", pa.timestamp("us", tz="UTC")),
+        ]
+    )
+
+
+def to_record_batch(columns: ReadingColumns) -> Any:
+    """Create an Arrow record batch from a chunk of reading columns."""
+    pa = import_pyarrow()
+    schema = reading_schema()
+    arrays = [
+        pa.array(columns["reading_uuid"], pa.string()),
+        pa.array(columns["patient_uuid"], pa.string()),
+        pa.array(columns["value"], pa.string()),
+        pa.array(columns["unit"], pa.string()),
+        pa.array(columns["recorded_at"], schema.field("recorded_at").type),
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _ChunkSink:
+    """
+    A write-only file-like object which holds the bytes written to it
+    until they are drained.
+
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data: Any) -> int:
+        """Write some bytes to the sink."""
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        """The number of bytes written to the sink."""
+        return self._position
+
+    def flush(self):
+        """Flush the sink (a no-op)."""
+
+    def close(self):
+        """Close the sink."""
+        self.closed = True
+
+    def drain(self) -> bytes:
+        """Return (and forget) the bytes written since the last drain."""
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def export_readings(  # pylint: disable=too-many-arguments
+    store: AbstractGlucoseReadingStore,
+    export_format: str,
+    patient_uuids: Optional[Collection[Union[int, str, UUID]]] = None,
+    start: Optional[dt.datetime] = None,
+    end: Optional[dt.datetime] = None,
+    chunk_size: int = 10_000,
+) -> Iterator[bytes]:
+    """
+    Export readings from the store as an Arrow IPC stream or a Parquet file,
+    yielding the bytes written as each chunk of readings is converted.
+
+    """
+    pa = import_pyarrow()
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format!r}")
+
+    sink = _ChunkSink()
+    if export_format == "arrow":
+        writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), reading_schema())
+    else:
+        writer = pa.parquet.ParquetWriter(
+            pa.PythonFile(sink, mode="w"), reading_schema(), compression="zstd"
+        )
+
+    try:
+        for columns in store.iterate_reading_columns(
+            patient_uuids, start, end, chunk_size
+        ):
+            writer.write_batch(to_record_batch(columns))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,150 @@
+"""
+A compact record of a glucose reading, used inside the stores.
+
+Readings are validated once (as pydantic models) at the edge of the
+service. Inside the stores they are held as records with UUIDs as ints
+and timestamps as integer microseconds since the Unix epoch, which are
+much smaller and cheaper to create than the models. Models are only
+created again when readings are returned from a store, and are then kept on
+the record so readings which are read often are only created once.
+
+"""
+import datetime as dt
+from decimal import Decimal
+from typing import Any, Optional, Tuple, Union
+from uuid import UUID
+
+from .models import GlucoseReading
+
+EPOCH = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+"""The Unix epoch."""
+
+_MICROSECOND = dt.timedelta(microseconds=1)
+
+
+def to_epoch_micros(timestamp: dt.datetime) -> int:
+    """
+    Convert a timestamp to microseconds since the Unix epoch. Naive
+    timestamps are assumed to be in UTC.
+
+    """
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=dt.timezone.utc)
+    return (timestamp - EPOCH) // _MICROSECOND
+
+
+def from_epoch_micros(micros: int) -> dt.datetime:
+    """Convert microseconds since the Unix epoch to a TZ-aware UTC timestamp."""
+    return EPOCH + dt.timedelta(microseconds=micros)
+
+
+class ReadingRecord:
+    """
+    A compact record of a glucose reading. The value is kept as a string to
+    keep its decimal precision. Records shouldn't be modified, as the reading
+    created from a record is cached.
+
+    """
+
+    __slots__ = (
+        "reading_uuid",
+        "patient_uuid",
+        "value",
+        "unit",
+        "recorded_at",
+        "_reading",
+    )
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        reading_uuid: int,
+        patient_uuid: int,
+        value: str,
+        unit: str,
+        recorded_at: int,
+    ):
+        self.reading_uuid = reading_uuid
+        self.patient_uuid = patient_uuid
+        self.value = value
+        self.unit = unit
+        self.recorded_at = recorded_at
+        self._reading: Optional[GlucoseReading] = None
+
+    @classmethod
+    def from_reading(cls, reading: GlucoseReading) -> "ReadingRecord":
+        """Create a record from a (validated) reading."""
+        return cls(
+            reading.reading_uuid.int,
+            reading.patient_uuid.int,
+            str(reading.value),
+            reading.unit,
+            to_epoch_micros(reading.recorded_at),
+        )
+
+    @classmethod
+    def from_columns(  # pylint: disable=too-many-arguments
+        cls,
+        reading_uuid: Union[str, UUID],
+        patient_uuid: Union[str, UUID],
+        value: Any,
+        unit: str,
+        recorded_at: dt.datetime,
+    ) -> "ReadingRecord":
+        """
+        Create a record from the values of a row of reading columns (e.g. a
+        database row), as they are stored.
+
+        """
+        return cls(
+            UUID(str(reading_uuid)).int,
+            UUID(str(patient_uuid)).int,
+            str(value),
+            unit,
+            to_epoch_micros(recorded_at),
+        )
+
+    def to_reading(self) -> GlucoseReading:
+        """
+        Get a reading from the record. Records only hold valid readings, so
+        the reading isn't validated again, and it's only created the first
+        time it's needed.
+
+        """
+        if self._reading is None:
+            self._reading = GlucoseReading.construct(
+                reading_uuid=UUID(int=self.reading_uuid),
+                patient_uuid=UUID(int=self.patient_uuid),
+                value=Decimal(self.value),
+                unit=self.unit,
+                recorded_at=from_epoch_micros(self.recorded_at),
+            )
+        return self._reading
+
+    @property
+    def natural_key(self) -> Tuple[int, int]:
+        """The patient UUID and time recorded, which may be unique."""
+        return self.patient_uuid, self.recorded_at
+
+    def _astuple(self) -> Tuple[int, int, str, str, int]:
+        return (
+            self.reading_uuid,
+            self.patient_uuid,
+            self.value,
+            self.unit,
+            self.recorded_at,
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ReadingRecord):
+            return NotImplemented
+        return self._astuple() == other._astuple()
+
+    def __hash__(self) -> int:
+        return hash(self._astuple())
+
+    def __repr__(self) -> str:
+        return (
+            f"{type(self).__name__}(reading_uuid={UUID(int=self.reading_uuid)!s}, "
+            + f"patient_uuid={UUID(int=self.patient_uuid)!s}, value={self.value!r}, "
+            + f"unit={self.unit!r}, recorded_at={from_epoch_micros(self.recorded_at)})"
+        )
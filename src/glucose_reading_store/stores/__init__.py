@@ -1,7 +1,26 @@
 """
 Interface and implementations for reading stores.
 
+The stores are imported lazily (on first access), so using the fake store
+doesn't import SQLAlchemy.
+
 """
-from .base import AbstractGlucoseReadingStore
-from .fake import FakeGlucoseReadingStore
-from .sqlalchemy import SQLAlchemyGlucoseReadingStore
+from typing import TYPE_CHECKING
+
+from ..common import lazy_importer
+
+_LAZY_IMPORTS = {
+    "AbstractGlucoseReadingStore": ".base",
+    "FakeGlucoseReadingStore": ".fake",
+    "SQLAlchemyGlucoseReadingStore": ".sqlalchemy",
+}
+
+__all__ = list(_LAZY_IMPORTS)
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .base import AbstractGlucoseReadingStore
+    from .fake import FakeGlucoseReadingStore
+    from .sqlalchemy import SQLAlchemyGlucoseReadingStore
+
+
+__getattr__, __dir__ = lazy_importer(__name__, _LAZY_IMPORTS)
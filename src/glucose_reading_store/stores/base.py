@@ -4,11 +4,31 @@ This represents the interface used by the other stores.
 
 """
 from abc import ABCMeta, abstractmethod
+import datetime as dt
 from types import TracebackType
-from typing import Iterator, Type, Union
+from typing import (
+    Any,
+    Collection,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Type,
+    Union,
+)
 from uuid import UUID
 
+from ..common import parse_uuid
+from ..exceptions import NoSuchReading
 from ..models import GlucoseReading
+from ..records import ReadingRecord
+
+READING_COLUMNS = ("reading_uuid", "patient_uuid", "value", "unit", "recorded_at")
+"""The names of the columns yielded by `iterate_reading_columns`."""
+
+ReadingColumns = Dict[str, List[Any]]
+"""A chunk of readings, as a mapping of column name to column values."""
 
 
 class AbstractGlucoseReadingStore(metaclass=ABCMeta):
@@ -19,7 +39,19 @@ class AbstractGlucoseReadingStore(metaclass=ABCMeta):
     fetch or modify a reading that does not exist, and a pydantic
     `ValidationError` if the reading fails to validate. If a reading
     with the same reading UUID is added twice, a `DuplicateReading`
-    error should be raised.
+    error should be raised. Stores may optionally enforce uniqueness of
+    the natural key (patient UUID and recording time), raising a
+    `DuplicateReading` error if a second reading is added for a patient
+    at the same time.
+
+    Stores may hold readings internally as compact `ReadingRecord`s, and
+    provide the `*_record(s)` methods to skip creating pydantic models for
+    readings which have already been validated. Readings read from storage
+    which other writers can reach (e.g. a database) should still be
+    validated.
+
+    Stores may optionally have an archive of cold readings. If a reading is
+    not in the store, reads should fall through to the archive.
 
     If the store must be used as a context manager, it should raise a
     `NotInContext` error if access is attempted outside the context.
@@ -34,6 +66,52 @@ class AbstractGlucoseReadingStore(metaclass=ABCMeta):
 
         """
 
+    @abstractmethod
+    def add_readings(self, readings: Sequence[GlucoseReading]):
+        """
+        Create glucose readings in bulk, raising a `DuplicateReading`
+        exception (and adding none of the readings) if any of the readings
+        already exist in the store.
+
+        """
+
+    def add_record(self, record: ReadingRecord):
+        """
+        Create a glucose reading from a record, raising a `DuplicateReading`
+        exception if the reading already exists in the store.
+
+        """
+        self.add_reading(record.to_reading())
+
+    def add_records(self, records: Sequence[ReadingRecord]):
+        """
+        Create several glucose readings from records, in the same way as
+        `add_readings`.
+
+        """
+        self.add_readings([record.to_reading() for record in records])
+
+    def add_new_records(self, records: Sequence[ReadingRecord]) -> int:
+        """
+        Create glucose readings from records, skipping any readings whose
+        reading UUID is already in the store (or repeated in `records`), and
+        returning the number of readings skipped.
+
+        A `DuplicateReading` exception is still raised (and none of the
+        readings added) if a new reading has the same natural key as another
+        reading in a store with unique natural keys.
+
+        """
+        new_records: Dict[int, ReadingRecord] = {}
+        for record in records:
+            new_records.setdefault(record.reading_uuid, record)
+        existing = self.get_readings([UUID(int=uuid) for uuid in new_records])
+        for reading_uuid in existing:
+            del new_records[reading_uuid.int]
+
+        self.add_records(list(new_records.values()))
+        return len(records) - len(new_records)
+
     @abstractmethod
     def update_reading(self, reading: GlucoseReading):
         """
@@ -53,6 +131,27 @@ class AbstractGlucoseReadingStore(metaclass=ABCMeta):
 
         """
 
+    @abstractmethod
+    def get_readings(
+        self, reading_uuids: Collection[Union[int, str, UUID]]
+    ) -> Dict[UUID, GlucoseReading]:
+        """
+        Fetch several readings from their UUIDs, as a mapping of reading UUID
+        to reading. Readings which are not in the store are left out.
+
+        """
+
+    @abstractmethod
+    def find_reading(
+        self, patient_uuid: Union[int, str, UUID], recorded_at: dt.datetime
+    ) -> GlucoseReading:
+        """
+        Fetch a reading from its natural key (the patient UUID and the time
+        the reading was recorded), raising a `NoSuchReading` exception if
+        there is no such reading in the store.
+
+        """
+
     @abstractmethod
     def delete_reading(self, reading_uuid: Union[int, str, UUID]):
         """
@@ -61,10 +160,69 @@ class AbstractGlucoseReadingStore(metaclass=ABCMeta):
 
         """
 
+    @abstractmethod
+    def get_latest_readings(
+        self, patient_uuids: Collection[Union[int, str, UUID]]
+    ) -> Dict[UUID, GlucoseReading]:
+        """
+        Fetch the latest reading (by the time it was recorded) for each of
+        some patients, as a mapping of patient UUID to reading. Patients with
+        no readings are left out.
+
+        This should be a lookup of an index which is kept consistent with
+        the readings, rather than a scan of the patients' readings.
+
+        """
+
+    def get_latest_reading(self, patient_uuid: Union[int, str, UUID]) -> GlucoseReading:
+        """
+        Fetch the latest reading for a patient, raising a `NoSuchReading`
+        exception if the patient has no readings.
+
+        """
+        patient_uuid = parse_uuid(patient_uuid)
+        try:
+            return self.get_latest_readings([patient_uuid])[patient_uuid]
+        except KeyError as err:
+            raise NoSuchReading(repr(patient_uuid)) from err
+
     @abstractmethod
     def iterate_readings(self) -> Iterator[GlucoseReading]:
         """Iterate through all the readings in the store."""
 
+    @abstractmethod
+    def iterate_reading_columns(
+        self,
+        patient_uuids: Optional[Collection[Union[int, str, UUID]]] = None,
+        start: Optional[dt.datetime] = None,
+        end: Optional[dt.datetime] = None,
+        chunk_size: int = 10_000,
+    ) -> Iterator[ReadingColumns]:
+        """
+        Iterate through chunks of (at most `chunk_size`) readings as columns,
+        optionally filtering to readings from some patients, or readings
+        recorded from `start` (inclusive) until `end` (exclusive).
+
+        This avoids creating a `GlucoseReading` for each reading. UUIDs and
+        values are strings, and `recorded_at` is a naive datetime in UTC.
+
+        Unlike the other methods, this need not be called in the store's
+        context, so that the chunks can be streamed.
+
+        """
+
+    @abstractmethod
+    def archive_readings(self, before: dt.datetime) -> int:
+        """
+        Move readings recorded before `before` from the store to its archive,
+        returning the number of readings moved. This should raise a
+        `ValueError` if the store has no archive.
+
+        Once archived, readings can still be fetched and iterated through,
+        but they cannot be updated or deleted.
+
+        """
+
     @abstractmethod
     def __enter__(self):
         """Enter the reading store's context."""
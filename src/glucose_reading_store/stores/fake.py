@@ -5,55 +5,323 @@ on top of a dictionary.
 This should be used for unit tests.
 
 """
+import datetime as dt
+import threading
 from types import TracebackType
-from typing import Iterator, Type, Union
+from typing import (
+    TYPE_CHECKING,
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 from uuid import UUID
 
-from .base import AbstractGlucoseReadingStore
+from .base import READING_COLUMNS, AbstractGlucoseReadingStore, ReadingColumns
 from ..common import parse_uuid
 from ..exceptions import DuplicateReading, NoSuchReading
 from ..models import GlucoseReading
+from ..records import ReadingRecord, from_epoch_micros, to_epoch_micros
+
+if TYPE_CHECKING:  # pragma: no cover
+    from ..archive import ReadingArchive
+
+
+def _to_columns(records: Iterable[ReadingRecord]) -> ReadingColumns:
+    """Convert some records to reading columns."""
+    columns: ReadingColumns = {name: [] for name in READING_COLUMNS}
+    for record in records:
+        columns["reading_uuid"].append(str(UUID(int=record.reading_uuid)))
+        columns["patient_uuid"].append(str(UUID(int=record.patient_uuid)))
+        columns["value"].append(record.value)
+        columns["unit"].append(record.unit)
+        columns["recorded_at"].append(
+            from_epoch_micros(record.recorded_at).replace(tzinfo=None)
+        )
+    return columns
 
 
 class FakeGlucoseReadingStore(AbstractGlucoseReadingStore):
     """
     A fake glucose reading store built on top of a Python dictionary.
 
+    If `unique_patient_time` is set, a patient may only have a single
+    reading at any given time. If an `archive` is given, readings can be
+    moved to it with `archive_readings`.
+
     """
 
-    def __init__(self):
-        self._readings = {}
+    def __init__(
+        self,
+        unique_patient_time: bool = False,
+        archive: Optional["ReadingArchive"] = None,
+    ):
+        self._unique_patient_time = unique_patient_time
+        self._archive = archive
+        # Readings are held as compact records, keyed by UUIDs as ints.
+        self._records: Dict[int, ReadingRecord] = {}
+        # Natural key (patient UUID, recorded at) to reading UUID.
+        self._natural_keys: Dict[Tuple[int, int], int] = {}
+        # Patient UUID to the UUIDs of the patient's readings.
+        self._patient_readings: Dict[int, Set[int]] = {}
+        # Patient UUID to the patient's latest reading.
+        self._latest: Dict[int, ReadingRecord] = {}
+        # Reads may run in worker threads while readings are written, so
+        # writes (and reads of more than one record) hold the lock.
+        self._lock = threading.RLock()
+
+    def _check_natural_key(self, record: ReadingRecord):
+        """
+        Raise a `DuplicateReading` exception if natural keys must be unique
+        and another reading (in the store or its archive) already exists with
+        the same natural key.
+
+        """
+        if not self._unique_patient_time:
+            return
+
+        existing_uuid = self._natural_keys.get(record.natural_key)
+        if existing_uuid is not None and existing_uuid != record.reading_uuid:
+            raise DuplicateReading(repr(UUID(int=existing_uuid)))
+
+        # Archived readings still take up their patients' reading times.
+        if self._archive is not None:
+            archived = self._archive.find_readings(
+                [(record.patient_uuid, from_epoch_micros(record.recorded_at))]
+            )
+            for reading in archived.values():
+                if reading.reading_uuid.int != record.reading_uuid:
+                    raise DuplicateReading(repr(reading.reading_uuid))
+
+    def _insert(self, record: ReadingRecord):
+        """Insert a record and index it."""
+        reading_uuid = record.reading_uuid
+        self._records[reading_uuid] = record
+        self._natural_keys[record.natural_key] = reading_uuid
+        self._patient_readings.setdefault(record.patient_uuid, set()).add(reading_uuid)
+
+    def _remove(self, reading_uuid: int) -> ReadingRecord:
+        """
+        Remove a record and its indexes (other than the latest reading
+        index), returning the record.
+
+        """
+        try:
+            record = self._records.pop(reading_uuid)
+        except KeyError as err:
+            raise NoSuchReading(repr(UUID(int=reading_uuid))) from err
+
+        natural_key = record.natural_key
+        if self._natural_keys.get(natural_key) == reading_uuid:
+            del self._natural_keys[natural_key]
+
+        patient_readings = self._patient_readings[record.patient_uuid]
+        patient_readings.discard(reading_uuid)
+        if not patient_readings:
+            del self._patient_readings[record.patient_uuid]
+        return record
+
+    def _offer_latest(self, record: ReadingRecord):
+        """Make a record its patient's latest reading, if it's the latest."""
+        latest = self._latest.get(record.patient_uuid)
+        if latest is None or record.recorded_at >= latest.recorded_at:
+            self._latest[record.patient_uuid] = record
+
+    def _remove_latest(self, record: ReadingRecord):
+        """
+        Find a new latest reading for a patient, if `record` was their
+        latest reading and it has been removed.
+
+        """
+        latest = self._latest.get(record.patient_uuid)
+        if latest is None or latest.reading_uuid != record.reading_uuid:
+            return
+
+        del self._latest[record.patient_uuid]
+        for reading_uuid in self._patient_readings.get(record.patient_uuid, ()):
+            self._offer_latest(self._records[reading_uuid])
+        if self._archive is not None:
+            for columns in self._archive.iterate_reading_columns([record.patient_uuid]):
+                for row in zip(*(columns[name] for name in READING_COLUMNS)):
+                    self._offer_latest(ReadingRecord.from_columns(*row))
+
+    def _copy_records(self) -> List[ReadingRecord]:
+        """Copy the records, so they can be iterated through as they change."""
+        with self._lock:
+            return list(self._records.values())
+
+    def add_record(self, record: ReadingRecord):
+        with self._lock:
+            if record.reading_uuid in self._records:
+                raise DuplicateReading(repr(UUID(int=record.reading_uuid)))
+            self._check_natural_key(record)
+
+            self._insert(record)
+            self._offer_latest(record)
 
     def add_reading(self, reading: GlucoseReading):
-        reading_uuid = reading.reading_uuid
-        if reading_uuid in self._readings:
-            raise DuplicateReading(repr(reading_uuid))
+        self.add_record(ReadingRecord.from_reading(reading))
+
+    def add_records(self, records: Sequence[ReadingRecord]):
+        added = []
+        with self._lock:
+            try:
+                for record in records:
+                    self.add_record(record)
+                    added.append(record)
+            except DuplicateReading:
+                for record in added:
+                    self._remove_latest(self._remove(record.reading_uuid))
+                raise
+
+    def add_readings(self, readings: Sequence[GlucoseReading]):
+        self.add_records([ReadingRecord.from_reading(reading) for reading in readings])
 
-        self._readings[reading_uuid] = reading
+    def add_new_records(self, records: Sequence[ReadingRecord]) -> int:
+        with self._lock:
+            return super().add_new_records(records)
 
     def update_reading(self, reading: GlucoseReading):
-        reading_uuid = reading.reading_uuid
-        if reading_uuid not in self._readings:
-            raise NoSuchReading(repr(reading_uuid))
+        record = ReadingRecord.from_reading(reading)
+        with self._lock:
+            if record.reading_uuid not in self._records:
+                raise NoSuchReading(repr(reading.reading_uuid))
+            self._check_natural_key(record)
 
-        self._readings[reading_uuid] = reading
+            previous_record = self._remove(record.reading_uuid)
+            self._insert(record)
+            self._remove_latest(previous_record)
+            self._offer_latest(record)
 
     def get_reading(self, reading_uuid: Union[int, str, UUID]) -> GlucoseReading:
         reading_uuid = parse_uuid(reading_uuid)
         try:
-            return self._readings[reading_uuid]
+            return self._records[reading_uuid.int].to_reading()
         except KeyError as err:
+            if self._archive is not None:
+                return self._archive.get_reading(reading_uuid)
             raise NoSuchReading(repr(reading_uuid)) from err
 
-    def delete_reading(self, reading_uuid: Union[int, str, UUID]):
-        reading_uuid = parse_uuid(reading_uuid)
+    def get_readings(
+        self, reading_uuids: Collection[Union[int, str, UUID]]
+    ) -> Dict[UUID, GlucoseReading]:
+        records = {}
+        missing_uuids = []
+        with self._lock:
+            for reading_uuid in map(parse_uuid, reading_uuids):
+                record = self._records.get(reading_uuid.int)
+                if record is not None:
+                    records[reading_uuid] = record
+                else:
+                    missing_uuids.append(reading_uuid)
+
+        readings = {
+            reading_uuid: record.to_reading()
+            for reading_uuid, record in records.items()
+        }
+
+        if missing_uuids and self._archive is not None:
+            readings.update(self._archive.get_readings(missing_uuids))
+        return readings
+
+    def find_reading(
+        self, patient_uuid: Union[int, str, UUID], recorded_at: dt.datetime
+    ) -> GlucoseReading:
+        patient_uuid = parse_uuid(patient_uuid)
+        natural_key = (patient_uuid.int, to_epoch_micros(recorded_at))
         try:
-            del self._readings[reading_uuid]
+            return self._records[self._natural_keys[natural_key]].to_reading()
         except KeyError as err:
-            raise NoSuchReading(reading_uuid) from err
+            if self._archive is not None:
+                return self._archive.find_reading(patient_uuid, recorded_at)
+            raise NoSuchReading(repr((patient_uuid, recorded_at))) from err
+
+    def delete_reading(self, reading_uuid: Union[int, str, UUID]):
+        with self._lock:
+            record = self._remove(parse_uuid(reading_uuid).int)
+            self._remove_latest(record)
+
+    def get_latest_readings(
+        self, patient_uuids: Collection[Union[int, str, UUID]]
+    ) -> Dict[UUID, GlucoseReading]:
+        latest_records = {}
+        with self._lock:
+            for patient_uuid in map(parse_uuid, patient_uuids):
+                latest = self._latest.get(patient_uuid.int)
+                if latest is not None:
+                    latest_records[patient_uuid] = latest
+        return {
+            patient_uuid: record.to_reading()
+            for patient_uuid, record in latest_records.items()
+        }
 
     def iterate_readings(self) -> Iterator[GlucoseReading]:
-        yield from self._readings.values()
+        for record in self._copy_records():
+            yield record.to_reading()
+        if self._archive is not None:
+            yield from self._archive.iterate_readings()
+
+    def iterate_reading_columns(
+        self,
+        patient_uuids: Optional[Collection[Union[int, str, UUID]]] = None,
+        start: Optional[dt.datetime] = None,
+        end: Optional[dt.datetime] = None,
+        chunk_size: int = 10_000,
+    ) -> Iterator[ReadingColumns]:
+        patient_filter = (
+            None
+            if patient_uuids is None
+            else {parse_uuid(uuid).int for uuid in patient_uuids}
+        )
+        start_micros = None if start is None else to_epoch_micros(start)
+        end_micros = None if end is None else to_epoch_micros(end)
+
+        matching_records = []
+        # Copy the records, as the chunks may be consumed outside the context.
+        for record in self._copy_records():
+            if patient_filter is not None and record.patient_uuid not in patient_filter:
+                continue
+            if start_micros is not None and record.recorded_at < start_micros:
+                continue
+            if end_micros is not None and record.recorded_at >= end_micros:
+                continue
+
+            matching_records.append(record)
+            if len(matching_records) == chunk_size:
+                yield _to_columns(matching_records)
+                matching_records = []
+
+        if matching_records:
+            yield _to_columns(matching_records)
+
+        if self._archive is not None:
+            yield from self._archive.iterate_reading_columns(
+                patient_uuids, start, end, chunk_size
+            )
+
+    def archive_readings(self, before: dt.datetime) -> int:
+        if self._archive is None:
+            raise ValueError("This reading store has no archive.")
+
+        before_micros = to_epoch_micros(before)
+        with self._lock:
+            cold_records = [
+                record
+                for record in self._records.values()
+                if record.recorded_at < before_micros
+            ]
+            self._archive.add_reading_columns(_to_columns(cold_records))
+            # Archived readings can still be patients' latest readings.
+            for record in cold_records:
+                self._remove(record.reading_uuid)
+        return len(cold_records)
 
     def __enter__(self):
         pass
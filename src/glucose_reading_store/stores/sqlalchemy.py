@@ -3,27 +3,127 @@ A concreate implementation of the glucose reading store built
 on top of SQLAlchemy
 
 """
+from contextlib import contextmanager
 import datetime as dt
+import threading
 from types import TracebackType
-from typing import Iterator, Optional, Type, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Collection,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 from uuid import UUID
 
-from sqlalchemy import Column, DateTime, String
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    String,
+    and_,
+    bindparam,
+    func,
+    inspect,
+    insert,
+    or_,
+    select,
+)
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.engine import Engine
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
 from sqlalchemy.orm.exc import NoResultFound
 
-from .base import AbstractGlucoseReadingStore
-from ..common import parse_uuid
-from ..exceptions import DuplicateReading, NoSuchReading, NotInContext
+from .base import READING_COLUMNS, AbstractGlucoseReadingStore, ReadingColumns
+from ..common import SCHEMA_MODES, parse_uuid
+from ..exceptions import DuplicateReading, NoSuchReading, NotInContext, SchemaNotReady
 from ..models import GlucoseReading
+from ..records import ReadingRecord, from_epoch_micros
+
+if TYPE_CHECKING:  # pragma: no cover
+    from ..archive import ReadingArchive
 
 
 Base = declarative_base()
 
 
-class GlucoseReadingEntry(Base):
+def _reading_from_columns(  # pylint: disable=too-many-arguments
+    reading_uuid: str,
+    patient_uuid: str,
+    value: str,
+    unit: str,
+    recorded_at: dt.datetime,
+) -> GlucoseReading:
+    """
+    Create a glucose reading from the values of a database row, validating
+    it (the database may hold readings which weren't written by this store).
+
+    """
+    # Some databases won't round-trip timezone information.
+    if recorded_at.tzinfo is None:
+        recorded_at = recorded_at.replace(tzinfo=dt.timezone.utc)
+
+    return GlucoseReading(
+        reading_uuid=reading_uuid,
+        patient_uuid=patient_uuid,
+        value=value,
+        unit=unit,
+        recorded_at=recorded_at,
+    )
+
+
+class _ReadingEntryMixin:
+    """Conversions between glucose readings and database entries."""
+
+    @staticmethod
+    def values_from_reading(reading: GlucoseReading) -> Dict[str, Any]:
+        """Get the column values of a database entry for a reading."""
+        return {
+            "reading_uuid": str(reading.reading_uuid),
+            "patient_uuid": str(reading.patient_uuid),
+            "value": str(reading.value),
+            "unit": reading.unit,
+            # Store `recorded_at` in UTC so we can always retrieve it
+            # in the correct timezone.
+            "recorded_at": reading.recorded_at.astimezone(dt.timezone.utc),
+        }
+
+    @staticmethod
+    def values_from_record(record: ReadingRecord) -> Dict[str, Any]:
+        """Get the column values of a database entry for a record."""
+        return {
+            "reading_uuid": str(UUID(int=record.reading_uuid)),
+            "patient_uuid": str(UUID(int=record.patient_uuid)),
+            "value": record.value,
+            "unit": record.unit,
+            "recorded_at": from_epoch_micros(record.recorded_at),
+        }
+
+    @classmethod
+    def from_reading(cls, reading: GlucoseReading):
+        """Create a glucose reading database entry from a reading."""
+        return cls(**cls.values_from_reading(reading))  # type: ignore
+
+    def values(self) -> Dict[str, Any]:
+        """Get the column values of the database entry."""
+        return {name: getattr(self, name) for name in READING_COLUMNS}
+
+    def to_reading(self) -> GlucoseReading:
+        """Create a glucose reading from a database entry."""
+        return _reading_from_columns(*(getattr(self, name) for name in READING_COLUMNS))
+
+
+class GlucoseReadingEntry(_ReadingEntryMixin, Base):
     """The database model for the glucose reading pydantic model."""
 
     __tablename__ = "readings"
@@ -36,52 +136,259 @@ class GlucoseReadingEntry(Base):
     unit = Column(String(length=10), nullable=False)
     recorded_at = Column(DateTime, nullable=False)
 
-    @classmethod
-    def from_reading(cls, reading: GlucoseReading):
-        """Create a glucose reading database entry from a reading."""
-        return cls(
-            reading_uuid=str(reading.reading_uuid),
-            patient_uuid=str(reading.patient_uuid),
-            value=str(reading.value),
-            unit=reading.unit,
-            # Store `recorded_at` in UTC so we can always retrieve it
-            # in the correct timezone.
-            recorded_at=reading.recorded_at.astimezone(dt.timezone.utc),
-        )
+    __table_args__ = (
+        # For exports filtered by patient and time.
+        Index("ix_readings_patient_uuid_recorded_at", "patient_uuid", "recorded_at"),
+    )
 
-    def to_reading(self) -> GlucoseReading:
-        """Create a glucose reading from a database entry."""
-        recorded_time: dt.datetime = self.recorded_at  # type: ignore
-        # Some databases won't round-trip timezone information.
-        if recorded_time.tzinfo is None:
-            recorded_time = recorded_time.replace(tzinfo=dt.timezone.utc)
-
-        return GlucoseReading(
-            patient_uuid=self.patient_uuid,
-            reading_uuid=self.reading_uuid,
-            value=self.value,
-            unit=self.unit,
-            recorded_at=recorded_time,
-        )
+
+class LatestReadingEntry(_ReadingEntryMixin, Base):
+    """
+    A copy of the latest reading for each patient, kept up to date as
+    readings are changed.
+
+    """
+
+    __tablename__ = "latest_readings"
+    patient_uuid = Column(String(length=36), primary_key=True)
+    reading_uuid = Column(String(length=36), nullable=False)
+    value = Column(String(length=10), nullable=False)
+    unit = Column(String(length=10), nullable=False)
+    recorded_at = Column(DateTime, nullable=False)
+
+
+class SchemaVersionEntry(Base):  # pylint: disable=too-few-public-methods
+    """
+    A marker of the version of the schema the database was created with, and
+    whether the optional unique index on patients' reading times was created.
+
+    """
+
+    __tablename__ = "schema_version"
+    version = Column(Integer, primary_key=True)
+    unique_patient_time = Column(Boolean, nullable=False, default=False)
+
+
+SCHEMA_VERSION = 2
+"""
+The current version of the database schema. This must be incremented when
+the tables or indexes change, so existing databases are updated.
+
+"""
+
+_ready_schemas: Set[Tuple[str, bool]] = set()
+"""
+The engine URLs of databases known to have the current schema, with whether
+they're known to have the unique index on patients' reading times.
+
+"""
+
+
+def _schema_cache_key(engine: Engine) -> Optional[str]:
+    """
+    The key of a database in the cache of ready schemas, or `None` if it
+    can't be cached (each in-memory SQLite engine is a separate database).
+
+    """
+    url = engine.url
+    if url.get_backend_name() == "sqlite" and url.database in {None, "", ":memory:"}:
+        return None
+    return url.render_as_string(hide_password=False)
+
+
+def clear_schema_cache():
+    """Forget which databases are known to have the current schema."""
+    _ready_schemas.clear()
+
+
+def get_schema_version(engine: Engine) -> Optional[int]:
+    """
+    Get the schema version recorded in a database, or `None` if none is
+    recorded (e.g. the database is empty or predates the version marker).
+
+    """
+    try:
+        with engine.connect() as connection:
+            return connection.execute(
+                select(func.max(SchemaVersionEntry.version))
+            ).scalar()
+    except SQLAlchemyError:
+        return None
+
+
+def _get_schema_marker(engine: Engine) -> Tuple[Optional[int], bool]:
+    """
+    Get the schema version recorded in a database, and whether the unique
+    index on patients' reading times was recorded as created.
+
+    """
+    table = SchemaVersionEntry.__table__
+    try:
+        with engine.connect() as connection:
+            row = connection.execute(
+                select(table.c.version, table.c.unique_patient_time)  # type: ignore
+                .order_by(table.c.version.desc())  # type: ignore
+                .limit(1)
+            ).first()
+    except SQLAlchemyError:
+        # The marker predates recording the unique index.
+        return get_schema_version(engine), False
+    if row is None:
+        return None, False
+    return row.version, bool(row.unique_patient_time)
+
+
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+"""The `insert` constructs of dialects which support `ON CONFLICT DO UPDATE`."""
+
+
+def _as_naive_utc(timestamp: dt.datetime) -> dt.datetime:
+    """Convert a timestamp to naive UTC, as some databases return them."""
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(dt.timezone.utc).replace(tzinfo=None)
+
+
+def _chunks(values: Sequence[Any], size: int = 500) -> Iterator[Sequence[Any]]:
+    """Split values into chunks, e.g. to keep `IN` clauses to a sane size."""
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+
+PATIENT_TIME_INDEX = Index(
+    "uq_readings_patient_uuid_recorded_at",
+    GlucoseReadingEntry.patient_uuid,
+    GlucoseReadingEntry.recorded_at,
+    unique=True,
+)
+"""
+An optional unique index on the natural key of a reading. This is kept out
+of the table metadata so that it's only created if the store is configured
+to enforce it.
+
+"""
+GlucoseReadingEntry.__table__.indexes.discard(PATIENT_TIME_INDEX)  # type: ignore
 
 
 class SQLAlchemyGlucoseReadingStore(AbstractGlucoseReadingStore):
     """
     A glucose reading store built on top of SQLAlchemy.
 
+    If `unique_patient_time` is set, a unique index is created on the
+    patient UUID and recording time, so a patient may only have a single
+    reading at any given time. If an `archive` is given, readings can be
+    moved to it with `archive_readings`.
+
+    `schema_mode` is one of `SCHEMA_MODES`. The schema version (and whether
+    the unique index has been created) is checked once per database in each
+    process, rather than reflecting the database each time a store is
+    created. In `skip` mode, the unique index is assumed to exist too.
+
     """
 
-    def __init__(self, engine: Engine):
-        Base.metadata.create_all(engine)
+    def __init__(
+        self,
+        engine: Engine,
+        unique_patient_time: bool = False,
+        archive: Optional["ReadingArchive"] = None,
+        schema_mode: str = "create",
+    ):
+        if schema_mode not in SCHEMA_MODES:
+            raise ValueError(f"Unsupported schema mode: {schema_mode!r}")
+
+        self._engine = engine
+        self._unique_patient_time = unique_patient_time
+        self._archive = archive
         self._session_factory = sessionmaker(engine)
-        self.__session: Optional[Session] = None
+        # Each thread has its own session, so the store can be used from a
+        # pool of threads.
+        self.__local = threading.local()
+
+        if schema_mode != "skip":
+            self._prepare_schema(schema_mode == "create", unique_patient_time)
+
+    def _prepare_schema(self, create: bool, unique_patient_time: bool):
+        """
+        Make sure the database has the current schema (including the unique
+        index on patients' reading times, if `unique_patient_time` is set),
+        creating it if `create` is set or raising a `SchemaNotReady`
+        exception otherwise.
+
+        """
+        cache_key = _schema_cache_key(self._engine)
+        if cache_key is not None and (cache_key, unique_patient_time) in _ready_schemas:
+            return
+
+        version, has_patient_time_index = _get_schema_marker(self._engine)
+        if version != SCHEMA_VERSION:
+            if not create or (version is not None and version > SCHEMA_VERSION):
+                raise SchemaNotReady(
+                    f"Expected schema version {SCHEMA_VERSION}, found {version}."
+                )
+            has_patient_time_index = self._create_schema(unique_patient_time)
+        elif unique_patient_time and not has_patient_time_index:
+            if not create:
+                raise SchemaNotReady(
+                    "The unique index on patients' reading times doesn't exist."
+                )
+            has_patient_time_index = self._create_schema(unique_patient_time)
+
+        if cache_key is not None:
+            # A schema with the unique index is ready for any store.
+            _ready_schemas.update(
+                (cache_key, unique) for unique in (False, has_patient_time_index)
+            )
+
+    def _create_schema(self, unique_patient_time: bool) -> bool:
+        """
+        Create or update the schema (with the unique index on patients'
+        reading times if `unique_patient_time` is set), and record its
+        version. Returns whether the unique index exists.
+
+        """
+        has_latest_readings = inspect(self._engine).has_table(
+            LatestReadingEntry.__tablename__
+        )
+        Base.metadata.create_all(self._engine)
+        # `create_all` only creates indexes with new tables, so create any
+        # which have been added to existing tables.
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(self._engine, checkfirst=True)
+        if unique_patient_time:
+            PATIENT_TIME_INDEX.create(self._engine, checkfirst=True)
+        has_patient_time_index = PATIENT_TIME_INDEX.name in {
+            index["name"]
+            for index in inspect(self._engine).get_indexes(
+                GlucoseReadingEntry.__tablename__
+            )
+        }
+
+        # Backfill the latest readings if they've been added to an
+        # existing database.
+        if not has_latest_readings:
+            self.rebuild_latest_readings()
+
+        # Recreate the marker, in case it predates a column being added.
+        table = SchemaVersionEntry.__table__
+        with self._engine.begin() as connection:
+            table.drop(connection, checkfirst=True)  # type: ignore
+            table.create(connection)  # type: ignore
+            connection.execute(
+                insert(table).values(  # type: ignore
+                    version=SCHEMA_VERSION,
+                    unique_patient_time=has_patient_time_index,
+                )
+            )
+        return has_patient_time_index
 
     @property
     def _session(self) -> Session:
         """The session, if the store is being used as a context."""
-        if self.__session is None:
+        session: Optional[Session] = getattr(self.__local, "session", None)
+        if session is None:
             raise NotInContext("This reading store must be used as a context manager.")
-        return self.__session
+        return session
 
     def _get_current_entry(self, reading_uuid: str) -> GlucoseReadingEntry:
         """Return the current entry for a given UUID (as a string)."""
@@ -94,8 +401,123 @@ class SQLAlchemyGlucoseReadingStore(AbstractGlucoseReadingStore):
         except NoResultFound as err:
             raise NoSuchReading(UUID(reading_uuid)) from err
 
+    def _offer_latest(self, all_values: Sequence[Dict[str, Any]]):
+        """
+        Make readings (as column values) their patients' latest readings, if
+        they're more recent than the patients' current latest readings.
+
+        Where the database supports it, this is a single upsert so concurrent
+        transactions adding a patient's first readings don't collide.
+
+        """
+        table = LatestReadingEntry.__table__
+        dialect_insert = _UPSERT_INSERTS.get(self._engine.dialect.name)
+        if dialect_insert is not None:
+            upsert = dialect_insert(table)
+            upsert = upsert.on_conflict_do_update(
+                index_elements=[table.c.patient_uuid],  # type: ignore
+                set_={
+                    name: upsert.excluded[name]
+                    for name in READING_COLUMNS
+                    if name != "patient_uuid"
+                },
+                where=upsert.excluded.recorded_at >= table.c.recorded_at,  # type: ignore
+            )
+            self._session.execute(upsert, list(all_values))
+            return
+
+        for values in all_values:
+            update = (
+                table.update()  # type: ignore
+                .where(
+                    table.c.patient_uuid == values["patient_uuid"],  # type: ignore
+                    table.c.recorded_at <= values["recorded_at"],  # type: ignore
+                )
+                .values(**values)
+            )
+            if self._session.execute(update).rowcount:  # type: ignore
+                continue
+            # The patient has no latest reading, or a more recent one. If
+            # another transaction inserts one first, retry the update.
+            try:
+                with self._session.begin_nested():
+                    self._session.execute(insert(table).values(**values))  # type: ignore
+            except IntegrityError:
+                self._session.execute(update)
+
+    def _find_latest_values(self, patient_uuid: str) -> Optional[Dict[str, Any]]:
+        """
+        Find the column values of a patient's latest reading in the database
+        or the archive, or `None` if they have no readings.
+
+        """
+        entry = (
+            self._session.query(GlucoseReadingEntry)
+            .filter(GlucoseReadingEntry.patient_uuid == patient_uuid)
+            .order_by(GlucoseReadingEntry.recorded_at.desc())
+            .first()
+        )
+        latest_values = None if entry is None else entry.values()
+        if self._archive is None:
+            return latest_values
+
+        for columns in self._archive.iterate_reading_columns([patient_uuid]):
+            for row in zip(*(columns[name] for name in READING_COLUMNS)):
+                values = dict(zip(READING_COLUMNS, row))
+                if latest_values is None or _as_naive_utc(
+                    values["recorded_at"]
+                ) > _as_naive_utc(latest_values["recorded_at"]):
+                    latest_values = values
+        return latest_values
+
+    def _remove_latest(self, patient_uuid: str, reading_uuid: str):
+        """
+        Find a new latest reading for a patient, if the reading with UUID
+        `reading_uuid` was their latest reading and it has been changed.
+
+        """
+        table = LatestReadingEntry.__table__
+        latest_uuid = self._session.execute(
+            select(table.c.reading_uuid).where(  # type: ignore
+                table.c.patient_uuid == patient_uuid  # type: ignore
+            )
+        ).scalar()
+        if latest_uuid != reading_uuid:
+            return
+
+        conditions = [
+            table.c.patient_uuid == patient_uuid,  # type: ignore
+            table.c.reading_uuid == reading_uuid,  # type: ignore
+        ]
+        values = self._find_latest_values(patient_uuid)
+        if values is None:
+            self._session.execute(table.delete().where(*conditions))  # type: ignore
+        else:
+            self._session.execute(
+                table.update().where(*conditions).values(**values)  # type: ignore
+            )
+
+    def _check_archived_natural_keys(self, all_values: Sequence[Dict[str, Any]]):
+        """
+        Raise a `DuplicateReading` exception if natural keys must be unique
+        and any readings (as column values) have the same natural key as an
+        archived reading, as the unique index only covers the database.
+
+        """
+        if not self._unique_patient_time or self._archive is None:
+            return
+
+        archived = self._archive.find_readings(
+            [(values["patient_uuid"], values["recorded_at"]) for values in all_values]
+        )
+        reading_uuids = {values["reading_uuid"] for values in all_values}
+        for reading in archived.values():
+            if str(reading.reading_uuid) not in reading_uuids:
+                raise DuplicateReading(reading.reading_uuid)
+
     def add_reading(self, reading: GlucoseReading):
         entry = GlucoseReadingEntry.from_reading(reading)
+        self._check_archived_natural_keys([entry.values()])
         self._session.add(entry)
         try:
             self._session.flush()
@@ -103,9 +525,102 @@ class SQLAlchemyGlucoseReadingStore(AbstractGlucoseReadingStore):
             self._session.rollback()
             raise DuplicateReading(reading.reading_uuid) from err
 
+        self._offer_latest([entry.values()])
+
+    def add_readings(self, readings: Sequence[GlucoseReading]):
+        self.add_records([ReadingRecord.from_reading(reading) for reading in readings])
+
+    def add_records(self, records: Sequence[ReadingRecord]):
+        if not records:
+            return
+
+        # Insert with a single `executemany` rather than flushing an ORM
+        # entry for each reading.
+        all_values = [
+            GlucoseReadingEntry.values_from_record(record) for record in records
+        ]
+        self._check_archived_natural_keys(all_values)
+        try:
+            self._session.execute(
+                insert(GlucoseReadingEntry.__table__), all_values  # type: ignore
+            )
+        except IntegrityError as err:
+            self._session.rollback()
+            raise DuplicateReading(
+                [values["reading_uuid"] for values in all_values]
+            ) from err
+
+        latest_values: Dict[str, Dict[str, Any]] = {}
+        for values in all_values:
+            current = latest_values.get(values["patient_uuid"])
+            if current is None or values["recorded_at"] >= current["recorded_at"]:
+                latest_values[values["patient_uuid"]] = values
+
+        self._offer_latest(list(latest_values.values()))
+
+    def add_new_records(self, records: Sequence[ReadingRecord]) -> int:
+        new_records: Dict[str, ReadingRecord] = {}
+        for record in records:
+            new_records.setdefault(str(UUID(int=record.reading_uuid)), record)
+
+        # Only fetch the UUIDs of existing readings, rather than building
+        # readings from them as `get_readings` would.
+        table = GlucoseReadingEntry.__table__
+        existing_uuids: Set[str] = set()
+        for chunk in _chunks(list(new_records)):
+            existing_uuids.update(
+                self._session.execute(
+                    select(table.c.reading_uuid).where(  # type: ignore
+                        table.c.reading_uuid.in_(chunk)  # type: ignore
+                    )
+                ).scalars()
+            )
+        if self._archive is not None:
+            existing_uuids.update(
+                str(reading_uuid)
+                for reading_uuid in self._archive.get_readings(
+                    [uuid for uuid in new_records if uuid not in existing_uuids]
+                )
+            )
+        for reading_uuid in existing_uuids:
+            del new_records[reading_uuid]
+
+        self.add_records(list(new_records.values()))
+        return len(records) - len(new_records)
+
+    @contextmanager
+    def without_indexes(self) -> Iterator[None]:
+        """
+        Drop the (non-primary key) indexes on the readings table for the
+        duration of the context, e.g. to speed up bulk loads. The indexes
+        are rebuilt when the context exits.
+
+        The unique index on the natural key (if the store enforces it) is
+        kept, so duplicate readings are still rejected during the load.
+
+        """
+        table = GlucoseReadingEntry.__table__
+        existing_names = {
+            index["name"] for index in inspect(self._engine).get_indexes(table.name)
+        }
+        dropped: List[Index] = [
+            index
+            for index in table.indexes  # type: ignore
+            if index.name in existing_names and not index.unique
+        ]
+        for index in dropped:
+            index.drop(self._engine)
+        try:
+            yield
+        finally:
+            for index in dropped:
+                index.create(self._engine)
+
     def update_reading(self, reading: GlucoseReading):
         new_entry = GlucoseReadingEntry.from_reading(reading)
         current_entry = self._get_current_entry(new_entry.reading_uuid)
+        self._check_archived_natural_keys([new_entry.values()])
+        previous_patient_uuid: str = current_entry.patient_uuid  # type: ignore
 
         current_entry.patient_uuid = new_entry.patient_uuid
         current_entry.value = new_entry.value
@@ -114,37 +629,305 @@ class SQLAlchemyGlucoseReadingStore(AbstractGlucoseReadingStore):
 
         try:
             self._session.flush()
+            self._remove_latest(previous_patient_uuid, new_entry.reading_uuid)
+            self._offer_latest([new_entry.values()])
+        except IntegrityError as err:
+            self._session.rollback()
+            raise DuplicateReading(self._find_clashing_uuid(new_entry)) from err
         except Exception as err:  # pylint: disable=broad-except
             self._session.rollback()
             raise err
 
+    def _find_clashing_uuid(self, entry: GlucoseReadingEntry) -> UUID:
+        """
+        Find the UUID of another reading with the same natural key as an
+        entry, or the entry's own UUID if there isn't one.
+
+        """
+        table = GlucoseReadingEntry.__table__
+        clashing_uuid = self._session.execute(
+            select(table.c.reading_uuid).where(  # type: ignore
+                table.c.patient_uuid == entry.patient_uuid,  # type: ignore
+                table.c.recorded_at == entry.recorded_at,  # type: ignore
+                table.c.reading_uuid != entry.reading_uuid,  # type: ignore
+            )
+        ).scalar()
+        return UUID(clashing_uuid or entry.reading_uuid)
+
     def get_reading(self, reading_uuid: Union[str, int, UUID]) -> GlucoseReading:
-        entry = self._get_current_entry(str(parse_uuid(reading_uuid)))
+        try:
+            entry = self._get_current_entry(str(parse_uuid(reading_uuid)))
+        except NoSuchReading:
+            if self._archive is not None:
+                return self._archive.get_reading(reading_uuid)
+            raise
+        return entry.to_reading()
+
+    def get_readings(
+        self, reading_uuids: Collection[Union[int, str, UUID]]
+    ) -> Dict[UUID, GlucoseReading]:
+        readings = {}
+        reading_uuid_strs = list(
+            dict.fromkeys(str(parse_uuid(uuid)) for uuid in reading_uuids)
+        )
+        for chunk in _chunks(reading_uuid_strs):
+            entry: GlucoseReadingEntry
+            for entry in self._session.query(GlucoseReadingEntry).filter(
+                GlucoseReadingEntry.reading_uuid.in_(chunk)
+            ):
+                reading = entry.to_reading()
+                readings[reading.reading_uuid] = reading
+
+        if self._archive is not None and len(readings) < len(reading_uuid_strs):
+            readings.update(
+                self._archive.get_readings(
+                    [uuid for uuid in reading_uuid_strs if UUID(uuid) not in readings]
+                )
+            )
+        return readings
+
+    def find_reading(
+        self, patient_uuid: Union[int, str, UUID], recorded_at: dt.datetime
+    ) -> GlucoseReading:
+        patient_uuid = str(parse_uuid(patient_uuid))
+        entry = (
+            self._session.query(GlucoseReadingEntry)
+            .filter(
+                GlucoseReadingEntry.patient_uuid == patient_uuid,
+                GlucoseReadingEntry.recorded_at
+                == recorded_at.astimezone(dt.timezone.utc),
+            )
+            .first()
+        )
+        if entry is None:
+            if self._archive is not None:
+                return self._archive.find_reading(patient_uuid, recorded_at)
+            raise NoSuchReading((UUID(patient_uuid), recorded_at))
         return entry.to_reading()
 
     def delete_reading(self, reading_uuid: Union[int, str, UUID]):
         entry = self._get_current_entry(str(parse_uuid(reading_uuid)))
+        patient_uuid: str = entry.patient_uuid  # type: ignore
         try:
             self._session.delete(entry)
             self._session.flush()
+            self._remove_latest(patient_uuid, entry.reading_uuid)  # type: ignore
         except Exception as err:  # pylint: disable=broad-except
             self._session.rollback()
             raise err
 
+    def get_latest_readings(
+        self, patient_uuids: Collection[Union[int, str, UUID]]
+    ) -> Dict[UUID, GlucoseReading]:
+        latest_readings = {}
+        patient_uuid_strs = [str(parse_uuid(uuid)) for uuid in patient_uuids]
+        for chunk in _chunks(patient_uuid_strs):
+            latest_entry: LatestReadingEntry
+            # Populate existing entries, as the latest readings are updated
+            # without the ORM.
+            for latest_entry in (
+                self._session.query(LatestReadingEntry)
+                .filter(LatestReadingEntry.patient_uuid.in_(chunk))
+                .populate_existing()
+            ):
+                reading = latest_entry.to_reading()
+                latest_readings[reading.patient_uuid] = reading
+        return latest_readings
+
+    def rebuild_latest_readings(self):
+        """
+        Rebuild the latest reading for each patient from all of the readings
+        (including any archived readings).
+
+        """
+        latest_values: Dict[str, Dict[str, Any]] = {}
+        for columns in self.iterate_reading_columns():
+            for row in zip(*(columns[name] for name in READING_COLUMNS)):
+                values = dict(zip(READING_COLUMNS, row))
+                current = latest_values.get(values["patient_uuid"])
+                if current is None or values["recorded_at"] >= current["recorded_at"]:
+                    latest_values[values["patient_uuid"]] = values
+
+        table = LatestReadingEntry.__table__
+        with self._engine.begin() as connection:
+            connection.execute(table.delete())  # type: ignore
+            if latest_values:
+                connection.execute(
+                    insert(table), list(latest_values.values())  # type: ignore
+                )
+
+    def _select_readings(self) -> Iterator[GlucoseReading]:
+        """
+        Iterate through the readings in the database, selecting the columns
+        rather than loading ORM entries.
+
+        """
+        table = GlucoseReadingEntry.__table__
+        columns = [table.c[name] for name in READING_COLUMNS]  # type: ignore
+        for row in self._session.execute(select(*columns)):
+            yield _reading_from_columns(*row)
+
+    def _iterate_archived_columns(
+        self,
+        patient_uuids: Optional[Collection[Union[int, str, UUID]]] = None,
+        start: Optional[dt.datetime] = None,
+        end: Optional[dt.datetime] = None,
+        chunk_size: int = 10_000,
+    ) -> Iterator[ReadingColumns]:
+        """
+        Iterate through chunks of archived readings as columns, leaving out
+        any readings which are still in the database (e.g. after a failed
+        archive job), as the database takes precedence.
+
+        """
+        if self._archive is None:
+            return
+
+        table = GlucoseReadingEntry.__table__
+        for columns in self._archive.iterate_reading_columns(
+            patient_uuids, start, end, chunk_size
+        ):
+            stored_uuids: Set[str] = set()
+            # Connect for each chunk, as the chunks may be consumed in
+            # different threads (which SQLite connections can't be shared by).
+            with self._engine.connect() as connection:
+                for chunk in _chunks(columns["reading_uuid"]):
+                    stored_uuids.update(
+                        connection.execute(
+                            select(table.c.reading_uuid).where(  # type: ignore
+                                table.c.reading_uuid.in_(chunk)  # type: ignore
+                            )
+                        ).scalars()
+                    )
+            if stored_uuids:
+                kept = [
+                    index
+                    for index, reading_uuid in enumerate(columns["reading_uuid"])
+                    if reading_uuid not in stored_uuids
+                ]
+                if not kept:
+                    continue
+                columns = {
+                    name: [values[index] for index in kept]
+                    for name, values in columns.items()
+                }
+            yield columns
+
     def iterate_readings(self) -> Iterator[GlucoseReading]:
-        entry: GlucoseReadingEntry
-        for entry in self._session.query(GlucoseReadingEntry):
-            yield entry.to_reading()
+        yield from self._select_readings()
+        for columns in self._iterate_archived_columns():
+            for row in zip(*(columns[name] for name in READING_COLUMNS)):
+                yield _reading_from_columns(*row)
+
+    def iterate_reading_columns(
+        self,
+        patient_uuids: Optional[Collection[Union[int, str, UUID]]] = None,
+        start: Optional[dt.datetime] = None,
+        end: Optional[dt.datetime] = None,
+        chunk_size: int = 10_000,
+    ) -> Iterator[ReadingColumns]:
+        table = GlucoseReadingEntry.__table__
+        query = select(*(table.c[name] for name in READING_COLUMNS))  # type: ignore
+        if patient_uuids is not None:
+            query = query.where(
+                table.c.patient_uuid.in_(  # type: ignore
+                    [str(parse_uuid(patient_uuid)) for patient_uuid in patient_uuids]
+                )
+            )
+        if start is not None:
+            query = query.where(
+                table.c.recorded_at >= start.astimezone(dt.timezone.utc)  # type: ignore
+            )
+        if end is not None:
+            query = query.where(
+                table.c.recorded_at < end.astimezone(dt.timezone.utc)  # type: ignore
+            )
+
+        # Page through the readings (by time recorded, then UUID) with a
+        # short-lived connection per chunk, so the chunks can be streamed
+        # outside the store's context and consumed in different threads (e.g.
+        # by a streamed response), which SQLite connections can't be shared by.
+        query = query.order_by(table.c.recorded_at, table.c.reading_uuid).limit(
+            chunk_size
+        )
+        page_query = query
+        while True:
+            with self._engine.connect() as connection:
+                rows = connection.execute(page_query).all()
+            if not rows:
+                break
+
+            yield dict(zip(READING_COLUMNS, map(list, zip(*rows))))
+            if len(rows) < chunk_size:
+                break
+            last_recorded_at, last_uuid = rows[-1].recorded_at, rows[-1].reading_uuid
+            page_query = query.where(
+                or_(
+                    table.c.recorded_at > last_recorded_at,  # type: ignore
+                    and_(
+                        table.c.recorded_at == last_recorded_at,  # type: ignore
+                        table.c.reading_uuid > last_uuid,  # type: ignore
+                    ),
+                )
+            )
+
+        yield from self._iterate_archived_columns(patient_uuids, start, end, chunk_size)
+
+    def archive_readings(self, before: dt.datetime, chunk_size: int = 100_000) -> int:
+        """
+        Move readings recorded before `before` to the archive in chunks of
+        `chunk_size`, returning the number of readings moved.
+
+        Each chunk is deleted from the database, written to the archive and
+        only then committed, so a failure to write the archive loses no
+        readings. If the commit itself fails, the chunk is left in both, in
+        which case the database takes precedence (and the archived copies
+        are left out when iterating through the readings).
+
+        """
+        if self._archive is None:
+            raise ValueError("This reading store has no archive.")
+
+        table = GlucoseReadingEntry.__table__
+        query = (
+            select(*(table.c[name] for name in READING_COLUMNS))  # type: ignore
+            .where(
+                table.c.recorded_at < before.astimezone(dt.timezone.utc)  # type: ignore
+            )
+            .limit(chunk_size)
+        )
+        delete_archived = table.delete().where(  # type: ignore
+            table.c.reading_uuid == bindparam("archived_uuid")  # type: ignore
+        )
+
+        archived = 0
+        while True:
+            with self._engine.begin() as connection:
+                rows = connection.execute(query).all()
+                if not rows:
+                    return archived
+
+                columns = dict(zip(READING_COLUMNS, map(list, zip(*rows))))
+                connection.execute(
+                    delete_archived,
+                    [
+                        {"archived_uuid": reading_uuid}
+                        for reading_uuid in columns["reading_uuid"]
+                    ],
+                )
+                self._archive.add_reading_columns(columns)
+            archived += len(rows)
 
     def __enter__(self):
-        self.__session = self._session_factory()
+        self.__local.session = self._session_factory()
         self._session.__enter__()
         return self
 
     def __exit__(
         self, exc_type: Type[Exception], exc_value: Exception, traceback: TracebackType
     ):
+        session = self._session
         if exc_type is None:
-            self.__session.commit()
-        self._session.__exit__(exc_type, exc_value, traceback)
-        self.__session = None
+            session.commit()
+        session.__exit__(exc_type, exc_value, traceback)
+        self.__local.session = None
@@ -0,0 +1,105 @@
+"""
+Tests for adaptive admission control.
+
+"""
+from fastapi.testclient import TestClient
+import pytest
+from starlette.types import Receive, Scope, Send
+
+from glucose_reading_server.admission import (
+    BULK_PRIORITY,
+    READ_PRIORITY,
+    WRITE_PRIORITY,
+    AdaptiveConcurrencyLimiter,
+    request_priority,
+)
+from glucose_reading_server.dependencies import concurrency_limiter
+from glucose_reading_server.middleware import ConcurrencyLimitMiddleware
+
+
+@pytest.mark.parametrize(
+    ["method", "path", "expected"],
+    [
+        ["GET", "/v1/reading/some-uuid", READ_PRIORITY],
+        ["POST", "/v1/reading:batchGet", READ_PRIORITY],
+        ["POST", "/v1/reading", WRITE_PRIORITY],
+        ["DELETE", "/v1/reading/some-uuid", WRITE_PRIORITY],
+        ["GET", "/v1/reading", BULK_PRIORITY],
+        ["GET", "/v1/reading/export", BULK_PRIORITY],
+        ["GET", "/v1/admin/profiles", None],
+    ],
+)
+def test_request_priority(method: str, path: str, expected: float):
+    """Test that bulk requests have a lower priority than reads and writes."""
+    assert request_priority(method, path) == expected
+
+
+def test_low_priority_requests_shed_first():
+    """Test that bulk requests are shed before reads."""
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=4)
+    assert limiter.try_acquire(BULK_PRIORITY)
+    assert limiter.try_acquire(BULK_PRIORITY)
+    assert not limiter.try_acquire(BULK_PRIORITY)
+    assert limiter.try_acquire(READ_PRIORITY)
+    assert limiter.try_acquire(READ_PRIORITY)
+    assert not limiter.try_acquire(READ_PRIORITY)
+
+    metrics = limiter.metrics
+    assert (metrics.in_flight, metrics.admitted, metrics.shed) == (4, 4, 2)
+    assert limiter.retry_headers() == {"Retry-After": "1"}
+
+
+def test_limit_adapts_to_latency():
+    """Test that the limit grows while requests are fast and shrinks if not."""
+    limiter = AdaptiveConcurrencyLimiter(
+        initial_limit=10, max_limit=20, target_latency=0.1, backoff=0.5
+    )
+    for _ in range(10):
+        assert limiter.try_acquire(READ_PRIORITY)
+        limiter.release(0.01)
+    assert 10.9 < limiter.metrics.limit < 11
+
+    # Slow requests released together only back off once.
+    for _ in range(3):
+        assert limiter.try_acquire(READ_PRIORITY)
+    for _ in range(3):
+        limiter.release(1.0)
+    assert 5.4 < limiter.metrics.limit < 5.5
+
+    # Requests which aren't timed don't change the limit.
+    assert limiter.try_acquire(BULK_PRIORITY)
+    limiter.release()
+    assert 5.4 < limiter.metrics.limit < 5.5
+    assert limiter.metrics.in_flight == 0
+
+
+def test_concurrency_limit_middleware():
+    """Test that requests are shed, and stay in flight until they've been sent."""
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1)
+    token = concurrency_limiter.set(limiter)
+    in_flight = []
+
+    async def app(_: Scope, __: Receive, send: Send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        in_flight.append(limiter.metrics.in_flight)
+        await send({"type": "http.response.body", "body": b""})
+
+    async def failing_app(_: Scope, __: Receive, ___: Send):
+        raise RuntimeError("failed")
+
+    try:
+        assert TestClient(ConcurrencyLimitMiddleware(app)).get("/v1/reading/uuid")
+        with pytest.raises(RuntimeError):
+            TestClient(ConcurrencyLimitMiddleware(failing_app)).get("/v1/reading/uuid")
+
+        assert limiter.try_acquire(READ_PRIORITY)
+        response = TestClient(ConcurrencyLimitMiddleware(app)).get("/v1/reading/uuid")
+        limiter.release()
+    finally:
+        concurrency_limiter.reset(token)
+
+    assert in_flight == [1]
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    metrics = limiter.metrics
+    assert (metrics.in_flight, metrics.admitted, metrics.shed) == (0, 3, 1)
@@ -0,0 +1,325 @@
+"""
+Tests for the app's routes.
+
+"""
+# pylint: disable=redefined-outer-name
+import datetime as dt
+from functools import partial
+from io import BytesIO
+import json
+from pathlib import Path
+import sys
+from tempfile import TemporaryDirectory
+from typing import Any, Dict, Iterator, List
+from uuid import UUID, uuid4
+
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import create_engine
+
+from glucose_reading_store.export import export_readings
+from glucose_reading_store.models import GlucoseReading
+from glucose_reading_store.stores import (
+    FakeGlucoseReadingStore,
+    SQLAlchemyGlucoseReadingStore,
+)
+from glucose_reading_server import app as app_module
+from glucose_reading_server.app import APP
+from glucose_reading_server.dependencies import reading_store, request_profiler
+from glucose_reading_server.profiling import RequestProfiler
+
+
+@pytest.fixture
+def reading() -> Iterator[GlucoseReading]:
+    """A sample glucose reading, recorded with microseconds."""
+    yield GlucoseReading(
+        patient_uuid=uuid4(),
+        value="5.5",
+        unit="mmol/L",
+        recorded_at=dt.datetime(2022, 1, 5, 9, 0, 0, 123456, tzinfo=dt.timezone.utc),
+    )
+
+
+@pytest.fixture
+def client(reading: GlucoseReading) -> Iterator[TestClient]:
+    """A client of the app, with a test store holding the sample reading."""
+    store = FakeGlucoseReadingStore()
+    with store:
+        store.add_reading(reading)
+
+    token = reading_store.set(store)
+    try:
+        yield TestClient(APP)
+    finally:
+        reading_store.reset(token)
+
+
+@pytest.fixture
+def unique_client() -> Iterator[TestClient]:
+    """A client of the app, with a test store with unique patient reading times."""
+    token = reading_store.set(FakeGlucoseReadingStore(unique_patient_time=True))
+    try:
+        yield TestClient(APP)
+    finally:
+        reading_store.reset(token)
+
+
+@pytest.fixture
+def create_body() -> Dict[str, Any]:
+    """The JSON body of a request to create a reading."""
+    return {
+        "patient_uuid": str(uuid4()),
+        "value": "6.2",
+        "unit": "mmol/L",
+        "recorded_at": "2022-01-06T09:30:00+00:00",
+    }
+
+
+@pytest.fixture
+def readings() -> List[GlucoseReading]:
+    """Sample readings from several patients, some recorded at the same time."""
+    recorded_at = dt.datetime(2022, 1, 5, 9, tzinfo=dt.timezone.utc)
+    return [
+        GlucoseReading(
+            patient_uuid=uuid4(),
+            value=f"{index}.25",
+            unit="mmol/L",
+            recorded_at=recorded_at + dt.timedelta(hours=index // 2),
+        )
+        for index in range(5)
+    ]
+
+
+@pytest.fixture
+def sqlite_client(
+    monkeypatch: pytest.MonkeyPatch, readings: List[GlucoseReading]
+) -> Iterator[TestClient]:
+    """
+    A client of the app, with a SQLite store holding the sample readings and
+    exports in chunks of two readings.
+
+    """
+    monkeypatch.setattr(
+        app_module, "export_readings", partial(export_readings, chunk_size=2)
+    )
+    with TemporaryDirectory() as temp_dir:
+        engine = create_engine(f"sqlite:///{Path(temp_dir, 'some_db.db')}")
+        store = SQLAlchemyGlucoseReadingStore(engine)
+        with store:
+            store.add_readings(readings)
+
+        token = reading_store.set(store)
+        try:
+            yield TestClient(APP)
+        finally:
+            reading_store.reset(token)
+
+
+@pytest.mark.parametrize("export_format", ["arrow", "parquet"])
+def test_export(
+    sqlite_client: TestClient, readings: List[GlucoseReading], export_format: str
+):
+    """Test that readings are exported (filtered by patient and time)."""
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    def read_export(**params) -> List[str]:
+        response = sqlite_client.get(
+            "/v1/reading/export", params={"format": export_format, **params}
+        )
+        assert response.status_code == 200
+        if export_format == "arrow":
+            table = pa.ipc.open_stream(response.content).read_all()
+        else:
+            table = pq.read_table(BytesIO(response.content))
+        return sorted(table.column("reading_uuid").to_pylist())
+
+    assert read_export() == sorted(str(reading.reading_uuid) for reading in readings)
+    assert read_export(
+        patient_uuid=[str(readings[0].patient_uuid), str(readings[3].patient_uuid)],
+        start=readings[2].recorded_at.isoformat(),
+    ) == [str(readings[3].reading_uuid)]
+
+
+def test_export_invalid_format(sqlite_client: TestClient):
+    """Test that unsupported export formats are rejected."""
+    assert sqlite_client.get("/v1/reading/export?format=csv").status_code == 400
+
+
+def test_batch_get_matches_get(client: TestClient, reading: GlucoseReading):
+    """Test that readings from a batch get are encoded as they are by a get."""
+    missing_uuid = str(uuid4())
+    response = client.post(
+        "/v1/reading:batchGet",
+        json={"reading_uuids": [str(reading.reading_uuid), missing_uuid]},
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["missing"] == [missing_uuid]
+
+    single_response = client.get(f"/v1/reading/{reading.reading_uuid}")
+    assert single_response.json() == body["readings"][0]
+    assert single_response.content in response.content
+
+
+def test_admin_endpoints_need_token(client: TestClient):
+    """Test that the admin endpoints need the admin token."""
+    token = request_profiler.set(RequestProfiler(admin_token="secret"))
+    try:
+        for path in ["/v1/admin/single-flight", "/v1/admin/concurrency-limit"]:
+            assert client.get(path).status_code == 403
+            assert (
+                client.get(path, headers={"X-Admin-Token": "wrong"}).status_code == 403
+            )
+            assert (
+                client.get(path, headers={"X-Admin-Token": "secret"}).status_code == 200
+            )
+    finally:
+        request_profiler.reset(token)
+
+
+def test_create_replays_idempotency_key(
+    client: TestClient, create_body: Dict[str, Any]
+):
+    """
+    Test that a retried create request returns the original reading, and that
+    an idempotency key can't be reused for a different reading.
+
+    """
+    headers = {"Idempotency-Key": str(uuid4())}
+    response = client.post("/v1/reading", json=create_body, headers=headers)
+    assert response.status_code == 201
+    assert "Idempotent-Replayed" not in response.headers
+
+    replayed = client.post("/v1/reading", json=create_body, headers=headers)
+    assert replayed.status_code == 200
+    assert replayed.headers["Idempotent-Replayed"] == "true"
+    assert replayed.json() == response.json()
+
+    other_body = {**create_body, "value": "7.3"}
+    assert (
+        client.post("/v1/reading", json=other_body, headers=headers).status_code == 422
+    )
+    assert len(client.get("/v1/reading").json()) == 2
+
+
+def test_create_replays_natural_key(
+    unique_client: TestClient, create_body: Dict[str, Any]
+):
+    """
+    Test that a reading resubmitted for the same patient and time returns the
+    original reading, if patient reading times are unique, and that a
+    different reading at the same time is rejected.
+
+    """
+    response = unique_client.post("/v1/reading", json=create_body)
+    assert response.status_code == 201
+
+    replayed = unique_client.post("/v1/reading", json=create_body)
+    assert replayed.status_code == 200
+    assert replayed.headers["Idempotent-Replayed"] == "true"
+    assert replayed.json() == response.json()
+
+    other_body = {**create_body, "value": "7.3"}
+    assert unique_client.post("/v1/reading", json=other_body).status_code == 400
+    assert len(unique_client.get("/v1/reading").json()) == 1
+
+
+def test_msgpack_create_get(client: TestClient, create_body: Dict[str, Any]):
+    """Test that readings can be created and fetched with MessagePack bodies."""
+    msgpack = pytest.importorskip("msgpack")
+    headers = {
+        "Content-Type": "application/msgpack",
+        "Accept": "application/msgpack",
+    }
+    patient_uuid = UUID(create_body["patient_uuid"])
+    body = {
+        **create_body,
+        "patient_uuid": patient_uuid.bytes,
+        "recorded_at": int(
+            dt.datetime.fromisoformat(create_body["recorded_at"]).timestamp()
+        ),
+    }
+
+    response = client.post(
+        "/v1/reading", data=msgpack.packb(body, use_bin_type=True), headers=headers
+    )
+    assert response.status_code == 201
+    assert response.headers["content-type"] == "application/msgpack"
+    created = msgpack.unpackb(response.content)
+    assert created["patient_uuid"] == patient_uuid.bytes
+    assert isinstance(created["reading_uuid"], bytes)
+    assert created["recorded_at"] == body["recorded_at"]
+
+    reading_uuid = UUID(bytes=created["reading_uuid"])
+    response = client.get(f"/v1/reading/{reading_uuid}", headers=headers)
+    assert response.status_code == 200
+    assert msgpack.unpackb(response.content) == created
+    json_reading = client.get(f"/v1/reading/{reading_uuid}").json()
+    assert json_reading["reading_uuid"] == str(reading_uuid)
+    assert json_reading["recorded_at"] == create_body["recorded_at"]
+
+
+def test_msgpack_not_installed(
+    monkeypatch: pytest.MonkeyPatch,
+    client: TestClient,
+    reading: GlucoseReading,
+    create_body: Dict[str, Any],
+):
+    """
+    Test that MessagePack responses aren't acceptable (406) and MessagePack
+    requests aren't supported (415) without `msgpack`.
+
+    """
+    monkeypatch.setitem(sys.modules, "msgpack", None)
+    accept = {"Accept": "application/msgpack"}
+
+    assert (
+        client.get(f"/v1/reading/{reading.reading_uuid}", headers=accept).status_code
+        == 406
+    )
+    assert (
+        client.get(
+            f"/v1/patient/{reading.patient_uuid}/latest", headers=accept
+        ).status_code
+        == 406
+    )
+    # The reading isn't created if the response can't be encoded.
+    assert (
+        client.post("/v1/reading", json=create_body, headers=accept).status_code == 406
+    )
+    assert len(client.get("/v1/reading").json()) == 1
+
+    response = client.post(
+        "/v1/reading",
+        data=b"\x80",
+        headers={"Content-Type": "application/msgpack"},
+    )
+    assert response.status_code == 415
+    assert client.get(f"/v1/reading/{reading.reading_uuid}").status_code == 200
+
+
+def test_latest_readings(client: TestClient, reading: GlucoseReading):
+    """Test that patients' latest readings can be fetched."""
+    unknown_uuid = uuid4()
+    expected = json.loads(reading.json())
+
+    response = client.get(f"/v1/patient/{reading.patient_uuid}/latest")
+    assert response.status_code == 200
+    assert response.json() == expected
+    assert client.get(f"/v1/patient/{unknown_uuid}/latest").status_code == 404
+
+    response = client.get(
+        "/v1/patients/latest",
+        params={"ids": f"{unknown_uuid}, {reading.patient_uuid}"},
+    )
+    assert response.status_code == 200
+    assert response.json() == [expected]
+    assert (
+        client.get("/v1/patients/latest", params={"ids": str(unknown_uuid)}).json()
+        == []
+    )
+    assert (
+        client.get("/v1/patients/latest", params={"ids": "not-a-uuid"}).status_code
+        == 400
+    )
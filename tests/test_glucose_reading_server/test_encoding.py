@@ -0,0 +1,52 @@
+"""
+Tests for JSON/MessagePack content negotiation.
+
+"""
+import datetime as dt
+from uuid import uuid4
+
+import pytest
+from starlette.requests import Request
+
+from glucose_reading_store.models import GlucoseReading
+from glucose_reading_server.encoding import reading_to_msgpack, wants_msgpack
+from glucose_reading_server.models import ReadingCreateRequest
+
+
+def make_request(accept: str) -> Request:
+    """Make a request with an `Accept` header."""
+    return Request({"type": "http", "headers": [(b"accept", accept.encode("latin-1"))]})
+
+
+@pytest.mark.parametrize(
+    ["accept", "expected"],
+    [
+        ["application/msgpack", True],
+        ["application/x-msgpack; q=0.9, application/json", False],
+        ["application/json; q=0.5, application/msgpack", True],
+        ["application/json, application/msgpack", False],
+        ["application/msgpack, application/json", True],
+        ["application/msgpack; q=0, */*", False],
+        ["*/*", False],
+        ["", False],
+    ],
+)
+def test_wants_msgpack(accept: str, expected: bool):
+    """Test that MessagePack responses are used if they're preferred."""
+    assert wants_msgpack(make_request(accept)) == expected
+
+
+def test_msgpack_round_trip():
+    """Test that MessagePack readings are valid create requests."""
+    msgpack = pytest.importorskip("msgpack")
+    reading = GlucoseReading(
+        patient_uuid=uuid4(),
+        value="5.50",
+        unit="mmol/L",
+        recorded_at=dt.datetime(2022, 3, 1, 12, tzinfo=dt.timezone.utc),
+    )
+
+    packed = msgpack.packb(reading_to_msgpack(reading), use_bin_type=True)
+    assert msgpack.unpackb(packed)["value"] == "5.50"
+    create_request = ReadingCreateRequest.parse_obj(msgpack.unpackb(packed))
+    assert create_request.dict() == reading.dict(exclude={"reading_uuid"})
@@ -0,0 +1,76 @@
+"""
+Tests for the idempotency key store.
+
+"""
+# pylint: disable=redefined-outer-name
+import datetime as dt
+from typing import Iterator
+from uuid import uuid4
+
+import pytest
+
+from glucose_reading_store.models import GlucoseReading
+from glucose_reading_server.idempotency import (
+    IdempotencyKeyReused,
+    IdempotencyKeyStore,
+)
+from glucose_reading_server.models import ReadingCreateRequest
+
+
+@pytest.fixture
+def create_request() -> Iterator[ReadingCreateRequest]:
+    """A sample reading create request."""
+    yield ReadingCreateRequest(
+        patient_uuid=uuid4(),
+        value="1.1",
+        unit="mmol/L",
+        recorded_at=dt.datetime.utcnow().replace(tzinfo=dt.timezone.utc),
+    )
+
+
+@pytest.fixture
+def reading(create_request: ReadingCreateRequest) -> Iterator[GlucoseReading]:
+    """The reading created by the sample create request."""
+    yield GlucoseReading(**create_request.dict())
+
+
+def test_replay(create_request: ReadingCreateRequest, reading: GlucoseReading):
+    """Test that the original reading is returned for a known key."""
+    keys = IdempotencyKeyStore()
+    assert keys.get("some-key", create_request) is None
+
+    keys.put("some-key", create_request, reading)
+    assert keys.get("some-key", create_request) == reading
+
+
+def test_reused_key_raises(
+    create_request: ReadingCreateRequest, reading: GlucoseReading
+):
+    """Test that reusing a key for a different request raises an error."""
+    keys = IdempotencyKeyStore()
+    keys.put("some-key", create_request, reading)
+
+    with pytest.raises(IdempotencyKeyReused):
+        keys.get("some-key", create_request.copy(update={"value": "2.2"}))
+
+
+def test_keys_evicted_when_full(
+    create_request: ReadingCreateRequest, reading: GlucoseReading
+):
+    """Test that the oldest keys are evicted when the store is full."""
+    keys = IdempotencyKeyStore(max_size=2)
+    for key in ["first", "second", "third"]:
+        keys.put(key, create_request, reading)
+
+    assert len(keys) == 2
+    assert keys.get("first", create_request) is None
+    assert keys.get("third", create_request) == reading
+
+
+def test_keys_expire(create_request: ReadingCreateRequest, reading: GlucoseReading):
+    """Test that keys expire after their TTL."""
+    keys = IdempotencyKeyStore(ttl=0)
+    keys.put("some-key", create_request, reading)
+
+    assert keys.get("some-key", create_request) is None
+    assert len(keys) == 0
@@ -0,0 +1,51 @@
+"""
+Tests for the command line app.
+
+"""
+import contextvars
+import datetime as dt
+from pathlib import Path
+import sys
+from tempfile import TemporaryDirectory
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import create_engine
+
+from glucose_reading_store.models import GlucoseReading
+from glucose_reading_store.stores import SQLAlchemyGlucoseReadingStore
+from glucose_reading_server.__main__ import main
+
+
+def test_export_command(monkeypatch: pytest.MonkeyPatch):
+    """Test that the export command writes the readings to a file."""
+    pa = pytest.importorskip("pyarrow")
+    patient_uuid = uuid4()
+    readings = [
+        GlucoseReading(
+            patient_uuid=patient_uuid,
+            value=f"{index}.5",
+            unit="mg/dL",
+            recorded_at=dt.datetime(2022, 3, 1, index, tzinfo=dt.timezone.utc),
+        )
+        for index in range(3)
+    ]
+    with TemporaryDirectory() as temp_dir:
+        url = f"sqlite:///{Path(temp_dir, 'some_db.db')}"
+        store = SQLAlchemyGlucoseReadingStore(create_engine(url))
+        with store:
+            store.add_readings(readings)
+
+        output = Path(temp_dir, "readings.arrows")
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            ["glucose_reading_server", "-c", url, "export", "-o", str(output)],
+        )
+        # Run in a copy of the context, so the dependencies set aren't kept.
+        contextvars.copy_context().run(main)
+        table = pa.ipc.open_stream(output.read_bytes()).read_all()
+
+    assert table.column("reading_uuid").to_pylist() == [
+        str(reading.reading_uuid) for reading in readings
+    ]
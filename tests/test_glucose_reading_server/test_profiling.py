@@ -0,0 +1,83 @@
+"""
+Tests for request profiling.
+
+"""
+from fastapi.testclient import TestClient
+from starlette.types import Receive, Scope, Send
+
+from glucose_reading_server.dependencies import request_profiler
+from glucose_reading_server.middleware import ProfilingMiddleware
+from glucose_reading_server.profiling import PROFILE_HEADER, RequestProfiler, phase
+
+
+def test_should_profile():
+    """Test that requests are profiled with the admin token or by sampling."""
+    profiler = RequestProfiler(admin_token="secret")
+    assert profiler.should_profile("secret")
+    assert not profiler.should_profile("wrong")
+    assert not profiler.should_profile(None)
+
+    assert not RequestProfiler().should_profile("secret")
+    assert RequestProfiler(sample_rate=1.0).should_profile(None)
+
+
+def test_profile_records_phases():
+    """Test that phases are timed only while a request is being profiled."""
+    profiler = RequestProfiler()
+    with phase("validation"):
+        pass
+
+    with profiler.profile("GET", "/v1/reading") as profile:
+        with phase("validation"):
+            sorted(range(1_000))
+        with phase("validation"):
+            pass
+    profile.finish(200, 0.5)
+
+    assert list(profile.phases) == ["validation"]
+    assert profile.call_profile is not None
+    assert profile.to_dict()["status_code"] == 200
+
+
+def test_slowest_requests_kept():
+    """Test that only the slowest profiled requests are kept."""
+    profiler = RequestProfiler(buffer_size=3)
+    for duration in [0.3, 0.1, 0.5, 0.2, 0.4]:
+        with profiler.profile("GET", f"/{duration}") as profile:
+            pass
+        profile.finish(200, duration)
+        profiler.record(profile)
+
+    assert [profile.duration for profile in profiler.slowest()] == [0.5, 0.4, 0.3]
+
+
+def test_is_admin_token():
+    """Test that only the admin token is accepted, if one is set."""
+    profiler = RequestProfiler(admin_token="secret")
+    assert profiler.is_admin_token("secret")
+    assert not profiler.is_admin_token("secreT")
+    assert not profiler.is_admin_token("é")
+    assert not profiler.is_admin_token(None)
+    assert not RequestProfiler().is_admin_token("secret")
+
+
+def test_profiling_middleware():
+    """Test that the middleware profiles requests until they've been sent."""
+    profiler = RequestProfiler(admin_token="secret")
+    token = request_profiler.set(profiler)
+
+    async def app(_: Scope, __: Receive, send: Send):
+        await send({"type": "http.response.start", "status": 201, "headers": []})
+        with phase("encoding"):
+            await send({"type": "http.response.body", "body": b""})
+
+    try:
+        client = TestClient(ProfilingMiddleware(app))
+        client.get("/unprofiled")
+        client.get("/profiled", headers={PROFILE_HEADER: "secret"})
+    finally:
+        request_profiler.reset(token)
+
+    (profile,) = profiler.slowest()
+    assert (profile.path, profile.status_code) == ("/profiled", 201)
+    assert list(profile.phases) == ["encoding"]
@@ -0,0 +1,106 @@
+"""
+Tests for single-flight coalescing of store reads.
+
+"""
+import asyncio
+import threading
+
+from glucose_reading_server.single_flight import SingleFlight
+
+
+def test_concurrent_reads_are_coalesced():
+    """Test that identical concurrent reads share a single call."""
+    single_flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def read() -> int:
+        calls.append(None)
+        release.wait(5)
+        return len(calls)
+
+    async def run_reads():
+        reads = [
+            asyncio.ensure_future(single_flight.do(("reading", 1), read))
+            for _ in range(5)
+        ]
+        other = asyncio.ensure_future(single_flight.do(("reading", 2), read))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*reads), await other
+
+    results, other_result = asyncio.run(run_reads())
+    assert len(calls) == 2
+    assert len(set(results)) == 1
+    assert other_result in {1, 2}
+
+    metrics = single_flight.metrics
+    assert (metrics.requests, metrics.executions, metrics.coalesced) == (6, 2, 4)
+    assert metrics.in_flight == 0
+
+
+def test_forget_starts_new_read():
+    """Test that reads after a key is forgotten don't share the old result."""
+    single_flight = SingleFlight()
+    release = threading.Event()
+    values = iter(["before", "after"])
+
+    def read() -> str:
+        value = next(values)
+        if value == "before":
+            release.wait(5)
+        return value
+
+    async def run_reads():
+        before = asyncio.ensure_future(single_flight.do("key", read))
+        await asyncio.sleep(0.05)
+        single_flight.forget("key")
+        after = await single_flight.do("key", read)
+        release.set()
+        return await before, after
+
+    assert asyncio.run(run_reads()) == ("before", "after")
+    assert single_flight.metrics.invalidations == 1
+
+
+def test_exceptions_are_shared():
+    """Test that an exception from a shared read is raised for every caller."""
+    single_flight = SingleFlight()
+
+    def read():
+        raise KeyError("missing")
+
+    async def run_reads():
+        return await asyncio.gather(
+            single_flight.do("key", read),
+            single_flight.do("key", read),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run_reads())
+    assert all(isinstance(result, KeyError) for result in results)
+    assert single_flight.metrics.executions == 1
+
+
+def test_forget_kind():
+    """Test that forgetting a kind of key only forgets keys of that kind."""
+    single_flight = SingleFlight()
+    release = threading.Event()
+
+    def read() -> None:
+        release.wait(5)
+
+    async def run_reads():
+        reads = [
+            asyncio.ensure_future(single_flight.do(key, read))
+            for key in [("latest", 1), ("latest", 2), ("reading", 1)]
+        ]
+        await asyncio.sleep(0.05)
+        single_flight.forget_kind("latest")
+        in_flight = single_flight.metrics.in_flight
+        release.set()
+        await asyncio.gather(*reads)
+        return in_flight
+
+    assert asyncio.run(run_reads()) == 1
+    assert single_flight.metrics.invalidations == 2
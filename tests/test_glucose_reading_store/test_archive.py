@@ -0,0 +1,294 @@
+"""
+Tests for archiving cold readings.
+
+"""
+# pylint: disable=redefined-outer-name
+import datetime as dt
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any, Dict, Iterator, List
+from uuid import UUID, uuid4
+
+import pytest
+from sqlalchemy import create_engine
+
+from glucose_reading_store.archive import ReadingArchive
+from glucose_reading_store.exceptions import DuplicateReading, NoSuchReading
+from glucose_reading_store.models import GlucoseReading
+from glucose_reading_store.stores import (
+    AbstractGlucoseReadingStore,
+    FakeGlucoseReadingStore,
+    SQLAlchemyGlucoseReadingStore,
+)
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def readings() -> Iterator[List[GlucoseReading]]:
+    """Sample readings for a patient, from two different months."""
+    patient_uuid = uuid4()
+    yield [
+        GlucoseReading(
+            patient_uuid=patient_uuid,
+            value=f"{days}.1",
+            unit="mmol/L",
+            recorded_at=dt.datetime(2022, 1, 20, tzinfo=dt.timezone.utc)
+            + dt.timedelta(days=days),
+        )
+        for days in range(0, 40, 5)
+    ]
+
+
+@pytest.fixture
+def archive() -> Iterator[ReadingArchive]:
+    """A fixture providing an archive in a temporary directory."""
+    with TemporaryDirectory() as temp_dir:
+        yield ReadingArchive(Path(temp_dir, "archive"))
+
+
+@pytest.fixture
+def fake_store(archive: ReadingArchive) -> Iterator[FakeGlucoseReadingStore]:
+    """A fixture providing a fake store with an archive."""
+    yield FakeGlucoseReadingStore(archive=archive)
+
+
+@pytest.fixture
+def sqlite_store(archive: ReadingArchive) -> Iterator[SQLAlchemyGlucoseReadingStore]:
+    """A fixture providing a store using SQLite with an archive."""
+    with TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir, "some_db.db")
+        engine = create_engine(f"sqlite:///{path}")
+        yield SQLAlchemyGlucoseReadingStore(engine, archive=archive)
+
+
+@pytest.fixture
+def unique_fake_store(archive: ReadingArchive) -> Iterator[FakeGlucoseReadingStore]:
+    """A fixture providing a fake store with unique patient reading times and an archive."""
+    yield FakeGlucoseReadingStore(unique_patient_time=True, archive=archive)
+
+
+@pytest.fixture
+def unique_sqlite_store(
+    archive: ReadingArchive,
+) -> Iterator[SQLAlchemyGlucoseReadingStore]:
+    """A fixture providing a SQLite store with unique patient reading times and an archive."""
+    with TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir, "some_db.db")
+        engine = create_engine(f"sqlite:///{path}")
+        yield SQLAlchemyGlucoseReadingStore(
+            engine, unique_patient_time=True, archive=archive
+        )
+
+
+@pytest.mark.parametrize("store_fixture", ["sqlite_store", "fake_store"])
+def test_archived_readings_fall_through(
+    request: pytest.FixtureRequest,
+    store_fixture: str,
+    readings: List[GlucoseReading],
+):
+    """Test that archived readings can still be fetched and iterated through."""
+    store: AbstractGlucoseReadingStore = request.getfixturevalue(store_fixture)
+    with store:
+        for reading in readings:
+            store.add_reading(reading)
+
+    before = dt.datetime(2022, 2, 10, tzinfo=dt.timezone.utc)
+    assert store.archive_readings(before) == 5
+    assert store.archive_readings(before) == 0
+
+    with store:
+        for reading in readings:
+            assert store.get_reading(reading.reading_uuid) == reading
+            assert (
+                store.find_reading(reading.patient_uuid, reading.recorded_at) == reading
+            )
+        assert sorted(store, key=lambda reading: reading.recorded_at) == readings
+        assert store.get_readings(
+            [reading.reading_uuid for reading in readings] + [uuid4()]
+        ) == {reading.reading_uuid: reading for reading in readings}
+
+        with pytest.raises(NoSuchReading):
+            store.get_reading(uuid4())
+        with pytest.raises(NoSuchReading):
+            store.delete_reading(readings[0].reading_uuid)
+
+    chunks = store.iterate_reading_columns(
+        patient_uuids=[readings[0].patient_uuid],
+        start=readings[2].recorded_at,
+        end=readings[6].recorded_at,
+    )
+    reading_uuids = sorted(
+        reading_uuid for chunk in chunks for reading_uuid in chunk["reading_uuid"]
+    )
+    assert reading_uuids == sorted(
+        str(reading.reading_uuid) for reading in readings[2:6]
+    )
+
+
+@pytest.mark.parametrize("store_fixture", ["sqlite_store", "fake_store"])
+def test_archived_readings_can_become_latest(
+    request: pytest.FixtureRequest,
+    store_fixture: str,
+    readings: List[GlucoseReading],
+):
+    """
+    Test that an archived reading becomes its patient's latest reading if
+    the newer readings are deleted.
+
+    """
+    store: AbstractGlucoseReadingStore = request.getfixturevalue(store_fixture)
+    with store:
+        for reading in readings:
+            store.add_reading(reading)
+    store.archive_readings(readings[5].recorded_at)
+
+    patient_uuid = readings[0].patient_uuid
+    with store:
+        for reading in readings[5:]:
+            store.delete_reading(reading.reading_uuid)
+        assert store.get_latest_reading(patient_uuid) == readings[4]
+
+
+def test_failed_archive_keeps_readings(
+    monkeypatch: pytest.MonkeyPatch,
+    archive: ReadingArchive,
+    sqlite_store: SQLAlchemyGlucoseReadingStore,
+    readings: List[GlucoseReading],
+):
+    """Test that readings aren't deleted if they can't be archived."""
+    with sqlite_store:
+        for reading in readings:
+            sqlite_store.add_reading(reading)
+
+    def fail_to_archive(_columns: Any):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(archive, "add_reading_columns", fail_to_archive)
+    with pytest.raises(OSError):
+        sqlite_store.archive_readings(dt.datetime(2023, 1, 1, tzinfo=dt.timezone.utc))
+
+    with sqlite_store:
+        assert sorted(sqlite_store, key=lambda reading: reading.recorded_at) == readings
+
+
+def test_database_takes_precedence_over_archive(
+    archive: ReadingArchive,
+    sqlite_store: SQLAlchemyGlucoseReadingStore,
+    readings: List[GlucoseReading],
+):
+    """
+    Test that readings left in both the database and the archive (e.g. by a
+    failed archive job) are only iterated through once.
+
+    """
+    with sqlite_store:
+        for reading in readings:
+            sqlite_store.add_reading(reading)
+    archive.add_reading_columns(next(sqlite_store.iterate_reading_columns()))
+
+    with sqlite_store:
+        assert sorted(sqlite_store, key=lambda reading: reading.recorded_at) == readings
+    reading_uuids = [
+        reading_uuid
+        for chunk in sqlite_store.iterate_reading_columns(chunk_size=3)
+        for reading_uuid in chunk["reading_uuid"]
+    ]
+    assert sorted(reading_uuids) == sorted(
+        str(reading.reading_uuid) for reading in readings
+    )
+
+
+def test_archive_prunes_partitions(
+    archive: ReadingArchive, readings: List[GlucoseReading]
+):
+    """Test that only archive files overlapping a time range are read."""
+    store = FakeGlucoseReadingStore(archive=archive)
+    with store:
+        for reading in readings:
+            store.add_reading(reading)
+    store.archive_readings(dt.datetime(2023, 1, 1, tzinfo=dt.timezone.utc))
+
+    # pylint: disable=protected-access
+    assert len(archive._partitions()) == 2
+    assert (
+        len(archive._partitions(end=dt.datetime(2022, 2, 1, tzinfo=dt.timezone.utc)))
+        == 1
+    )
+
+
+@pytest.mark.parametrize("store_fixture", ["unique_sqlite_store", "unique_fake_store"])
+def test_archived_readings_keep_patient_times(
+    request: pytest.FixtureRequest,
+    store_fixture: str,
+    readings: List[GlucoseReading],
+):
+    """
+    Test that readings can't be added or moved to the same patient and time
+    as an archived reading, if the store enforces it.
+
+    """
+    store: AbstractGlucoseReadingStore = request.getfixturevalue(store_fixture)
+    with store:
+        for reading in readings:
+            store.add_reading(reading)
+    store.archive_readings(readings[-1].recorded_at)
+
+    archived, hot = readings[0], readings[-1]
+    duplicate = archived.copy(update={"reading_uuid": uuid4()})
+    with store:
+        with pytest.raises(DuplicateReading, match=str(archived.reading_uuid)):
+            store.add_reading(duplicate)
+    with store:
+        with pytest.raises(DuplicateReading, match=str(archived.reading_uuid)):
+            store.add_readings([duplicate])
+    with store:
+        with pytest.raises(DuplicateReading, match=str(archived.reading_uuid)):
+            store.update_reading(hot.copy(update={"recorded_at": archived.recorded_at}))
+
+    with store:
+        assert (
+            store.find_reading(archived.patient_uuid, archived.recorded_at) == archived
+        )
+        assert len(list(store)) == len(readings)
+
+
+def test_archive_skips_files_by_uuid(
+    monkeypatch: pytest.MonkeyPatch,
+    archive: ReadingArchive,
+    readings: List[GlucoseReading],
+):
+    """
+    Test that fetching readings by UUID only reads the archive files whose
+    range of UUIDs could hold them.
+
+    """
+    store = FakeGlucoseReadingStore(archive=archive)
+    with store:
+        for reading in readings:
+            store.add_reading(reading)
+    store.archive_readings(dt.datetime(2023, 1, 1, tzinfo=dt.timezone.utc))
+
+    read_paths: List[str] = []
+    read = archive._read  # pylint: disable=protected-access
+
+    def read_recorded(partition: Dict[str, Any], filters: List[Any]) -> Any:
+        read_paths.append(partition["path"])
+        return read(partition, filters)
+
+    monkeypatch.setattr(archive, "_read", read_recorded)
+    # The lowest and highest UUIDs are outside every file's range of UUIDs.
+    lowest, highest = UUID(int=0), UUID(int=2**128 - 1)
+    with pytest.raises(NoSuchReading):
+        archive.get_reading(lowest)
+    assert archive.get_readings([lowest, highest]) == {}
+    assert not read_paths
+
+    assert archive.get_reading(readings[0].reading_uuid) == readings[0]
+    assert read_paths
+
+
+def test_archive_requires_archive(readings: List[GlucoseReading]):
+    """Test that stores without an archive can't archive readings."""
+    with pytest.raises(ValueError):
+        FakeGlucoseReadingStore().archive_readings(readings[0].recorded_at)
@@ -0,0 +1,195 @@
+"""
+Tests for bulk imports of readings.
+
+"""
+# pylint: disable=redefined-outer-name
+import datetime as dt
+from decimal import Decimal
+import json
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any, Iterator, List
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+from glucose_reading_store.bulk_import import InvalidRow, import_readings
+from glucose_reading_store.models import GlucoseReading
+from glucose_reading_store.stores import (
+    FakeGlucoseReadingStore,
+    SQLAlchemyGlucoseReadingStore,
+)
+
+
+@pytest.fixture
+def temp_dir() -> Iterator[Path]:
+    """A temporary directory for import files."""
+    with TemporaryDirectory() as temp_dir:
+        yield Path(temp_dir)
+
+
+@pytest.fixture
+def readings() -> Iterator[List[GlucoseReading]]:
+    """Sample readings to import."""
+    yield [
+        GlucoseReading(
+            patient_uuid=uuid4(),
+            value=f"{index}.5",
+            unit="mmol/L",
+            recorded_at=dt.datetime(2020, 1, 1, index, tzinfo=dt.timezone.utc),
+        )
+        for index in range(10)
+    ]
+
+
+def write_csv(path: Path, readings: List[GlucoseReading]):
+    """Write readings to a CSV file (without reading UUIDs)."""
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("patient_uuid,value,unit,recorded_at\n")
+        for reading in readings:
+            file.write(
+                f"{reading.patient_uuid},{reading.value},{reading.unit},"
+                + f"{reading.recorded_at.isoformat()}\n"
+            )
+
+
+def write_ndjson(path: Path, readings: List[GlucoseReading]):
+    """Write readings to a newline-delimited JSON file."""
+    with open(path, "w", encoding="utf-8") as file:
+        for reading in readings:
+            file.write(reading.json() + "\n")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_import_csv(temp_dir: Path, readings: List[GlucoseReading], workers: int):
+    """Test that readings can be imported from a CSV file."""
+    path = temp_dir / "readings.csv"
+    write_csv(path, readings)
+    store = FakeGlucoseReadingStore()
+
+    progress = import_readings(store, path, batch_size=3, workers=workers)
+    assert (progress.rows_read, progress.rows_imported) == (10, 10)
+
+    with store:
+        imported = sorted(store, key=lambda reading: reading.recorded_at)
+    assert [reading.dict(exclude={"reading_uuid"}) for reading in imported] == [
+        reading.dict(exclude={"reading_uuid"}) for reading in readings
+    ]
+
+    # Reading UUIDs are derived from the content, so they aren't duplicated.
+    progress = import_readings(store, path, batch_size=3)
+    assert (progress.rows_imported, progress.rows_skipped) == (0, 10)
+
+
+def test_import_ndjson(temp_dir: Path, readings: List[GlucoseReading]):
+    """Test that readings can be imported from a NDJSON file."""
+    path = temp_dir / "readings.ndjson"
+    write_ndjson(path, readings)
+    store = FakeGlucoseReadingStore()
+
+    import_readings(store, path, batch_size=4)
+    with store:
+        assert sorted(store, key=str) == sorted(readings, key=str)
+
+
+def test_import_resumes_from_checkpoint(temp_dir: Path, readings: List[GlucoseReading]):
+    """Test that rows imported by a previous run are skipped."""
+    path = temp_dir / "readings.ndjson"
+    checkpoint_path = temp_dir / "checkpoint.json"
+    write_ndjson(path, readings[:6])
+    store = FakeGlucoseReadingStore()
+
+    import_readings(store, path, checkpoint_path=checkpoint_path)
+    assert json.loads(checkpoint_path.read_text())[str(path.resolve())] == 6
+
+    write_ndjson(path, readings)
+    progress = import_readings(store, path, checkpoint_path=checkpoint_path)
+    assert (progress.rows_read, progress.rows_imported) == (10, 4)
+
+
+def test_import_invalid_rows(temp_dir: Path, readings: List[GlucoseReading]):
+    """Test that invalid rows raise an error, or are skipped if requested."""
+    path = temp_dir / "readings.ndjson"
+    write_ndjson(path, readings)
+    with open(path, "a", encoding="utf-8") as file:
+        file.write('{"value": "not a reading"}\n')
+
+    with pytest.raises(InvalidRow):
+        import_readings(FakeGlucoseReadingStore(), path)
+
+    progress = import_readings(FakeGlucoseReadingStore(), path, skip_invalid=True)
+    assert (progress.rows_imported, progress.rows_skipped) == (10, 1)
+
+
+def test_import_keeps_unique_index(temp_dir: Path, readings: List[GlucoseReading]):
+    """
+    Test that readings with duplicate natural keys are skipped when indexes
+    are dropped during an import into a store with unique patient times.
+
+    """
+    path = temp_dir / "readings.csv"
+    duplicate = readings[0].copy(update={"value": Decimal("9.9")})
+    write_csv(path, [*readings, duplicate])
+    engine = create_engine(f"sqlite:///{temp_dir / 'some_db.db'}")
+    store = SQLAlchemyGlucoseReadingStore(engine, unique_patient_time=True)
+
+    with store.without_indexes():
+        progress = import_readings(store, path, batch_size=20)
+    assert (progress.rows_imported, progress.rows_skipped) == (10, 1)
+    assert "uq_readings_patient_uuid_recorded_at" in {
+        index["name"] for index in inspect(engine).get_indexes("readings")
+    }
+
+
+def test_import_derives_uuids_from_instants(
+    temp_dir: Path, readings: List[GlucoseReading]
+):
+    """
+    Test that the same reading is given the same UUID, whichever timezone
+    it was recorded in.
+
+    """
+    timezone = dt.timezone(dt.timedelta(hours=5))
+    path = temp_dir / "readings.csv"
+    write_csv(path, readings)
+    other_path = temp_dir / "other_readings.csv"
+    write_csv(
+        other_path,
+        [
+            reading.copy(
+                update={"recorded_at": reading.recorded_at.astimezone(timezone)}
+            )
+            for reading in readings
+        ],
+    )
+    store = FakeGlucoseReadingStore()
+
+    import_readings(store, path)
+    progress = import_readings(store, other_path)
+    assert (progress.rows_imported, progress.rows_skipped) == (0, 10)
+
+
+def test_import_skips_existing_readings_in_bulk(
+    monkeypatch: pytest.MonkeyPatch, temp_dir: Path, readings: List[GlucoseReading]
+):
+    """
+    Test that readings already in the store are skipped without falling back
+    to adding the rest of the batch one by one.
+
+    """
+    path = temp_dir / "readings.ndjson"
+    engine = create_engine(f"sqlite:///{temp_dir / 'some_db.db'}")
+    store = SQLAlchemyGlucoseReadingStore(engine)
+    write_ndjson(path, readings[:4])
+    import_readings(store, path)
+
+    def add_record(_record: Any):
+        raise AssertionError("Readings were added one by one")
+
+    monkeypatch.setattr(store, "add_record", add_record)
+    write_ndjson(path, [*readings, readings[-1]])
+    progress = import_readings(store, path, batch_size=20)
+    assert (progress.rows_imported, progress.rows_skipped) == (6, 5)
+    with store:
+        assert sorted(store, key=str) == sorted(readings, key=str)
@@ -2,11 +2,16 @@
 Tests for common code (e.g. UUID parsing).
 
 """
+import os
+from pathlib import Path
+import subprocess
+import sys
 from typing import Union
 from uuid import UUID
 
 import pytest
 
+import glucose_reading_store
 from glucose_reading_store.common import parse_uuid
 
 
@@ -48,3 +53,28 @@ def test_uuid_invalid_type():
 
     with pytest.raises(TypeError):
         parse_uuid(5.0)
+
+
+def test_lazy_submodules():
+    """
+    Test that submodules which haven't been imported yet can be accessed as
+    attributes of the (lazily imported) packages.
+
+    """
+    code = """
+import glucose_reading_store
+import glucose_reading_store.stores
+
+assert glucose_reading_store.models.GlucoseReading
+assert glucose_reading_store.export.export_readings
+assert glucose_reading_store.stores.fake.FakeGlucoseReadingStore
+try:
+    glucose_reading_store.no_such_module
+except AttributeError:
+    pass
+else:
+    raise AssertionError("no_such_module was found")
+"""
+    source_dir = Path(glucose_reading_store.__file__).parents[1]
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([str(source_dir), *sys.path])}
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
@@ -0,0 +1,108 @@
+"""
+Tests for columnar exports of readings.
+
+"""
+import datetime as dt
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import threading
+from typing import Iterator, List, Optional
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import create_engine
+
+from glucose_reading_store.export import export_readings
+from glucose_reading_store.models import GlucoseReading
+from glucose_reading_store.stores import (
+    FakeGlucoseReadingStore,
+    SQLAlchemyGlucoseReadingStore,
+)
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+@pytest.mark.parametrize("export_format", ["arrow", "parquet"])
+def test_export_readings(export_format: str):
+    """Test that exported readings can be read back."""
+    store = FakeGlucoseReadingStore()
+    readings = [
+        GlucoseReading(
+            patient_uuid=uuid4(),
+            value=f"{index}.5",
+            unit="mmol/L",
+            recorded_at=dt.datetime(2022, 3, 1, index, tzinfo=dt.timezone.utc),
+        )
+        for index in range(5)
+    ]
+    with store:
+        for reading in readings:
+            store.add_reading(reading)
+
+    data = b"".join(export_readings(store, export_format, chunk_size=2))
+    if export_format == "arrow":
+        table = pa.ipc.open_stream(data).read_all()
+    else:
+        table = pq.read_table(BytesIO(data))
+
+    assert table.column("reading_uuid").to_pylist() == [
+        str(reading.reading_uuid) for reading in readings
+    ]
+    assert table.column("value").to_pylist() == ["0.5", "1.5", "2.5", "3.5", "4.5"]
+    assert table.column("recorded_at").to_pylist() == [
+        reading.recorded_at for reading in readings
+    ]
+
+
+def test_export_invalid_format():
+    """Test that unsupported export formats raise an error."""
+    with pytest.raises(ValueError):
+        list(export_readings(FakeGlucoseReadingStore(), "csv"))
+
+
+def _next_in_thread(iterator: Iterator[bytes]) -> Optional[bytes]:
+    """Get the next item of an iterator in a new thread (or `None` if it's done)."""
+    results: List[Optional[bytes]] = []
+    thread = threading.Thread(target=lambda: results.append(next(iterator, None)))
+    thread.start()
+    thread.join()
+    assert results, "The iterator raised an error."
+    return results[0]
+
+
+def test_export_from_sqlite_across_threads():
+    """
+    Test that exports from SQLite can be consumed in different threads, as
+    streamed responses are.
+
+    """
+    with TemporaryDirectory() as temp_dir:
+        engine = create_engine(f"sqlite:///{Path(temp_dir, 'some_db.db')}")
+        store = SQLAlchemyGlucoseReadingStore(engine)
+        recorded_at = dt.datetime(2022, 3, 1, tzinfo=dt.timezone.utc)
+        # Readings at the same time are paged through by UUID.
+        readings = [
+            GlucoseReading(
+                patient_uuid=uuid4(),
+                value="5.5",
+                unit="mmol/L",
+                recorded_at=recorded_at + dt.timedelta(hours=index // 2),
+            )
+            for index in range(5)
+        ]
+        with store:
+            store.add_readings(readings)
+
+        chunks = export_readings(store, "arrow", chunk_size=2)
+        data = b""
+        chunk = _next_in_thread(chunks)
+        while chunk is not None:
+            data += chunk
+            chunk = _next_in_thread(chunks)
+
+    table = pa.ipc.open_stream(data).read_all()
+    assert sorted(table.column("reading_uuid").to_pylist()) == sorted(
+        str(reading.reading_uuid) for reading in readings
+    )
@@ -0,0 +1,64 @@
+"""
+Tests for compact reading records.
+
+"""
+import datetime as dt
+import pickle
+from uuid import uuid4
+
+import pytest
+
+from glucose_reading_store.models import GlucoseReading
+from glucose_reading_store.records import (
+    ReadingRecord,
+    from_epoch_micros,
+    to_epoch_micros,
+)
+
+
+@pytest.mark.parametrize(
+    "timestamp",
+    [
+        dt.datetime(2022, 3, 1, 12, 30, 15, 123456, tzinfo=dt.timezone.utc),
+        dt.datetime(1960, 1, 1, 0, 0, 0, 1, tzinfo=dt.timezone.utc),
+        dt.datetime(2022, 3, 1, 12, tzinfo=dt.timezone(dt.timedelta(hours=-5))),
+    ],
+)
+def test_epoch_micros_round_trip(timestamp: dt.datetime):
+    """Test that timestamps round trip through epoch microseconds exactly."""
+    assert from_epoch_micros(to_epoch_micros(timestamp)) == timestamp
+
+
+def test_record_round_trip():
+    """Test that readings round trip through records."""
+    reading = GlucoseReading(
+        patient_uuid=uuid4(),
+        value="5.50",
+        unit="mg/dL",
+        recorded_at=dt.datetime(2022, 3, 1, 12, 0, 0, 5, tzinfo=dt.timezone.utc),
+    )
+    record = ReadingRecord.from_reading(reading)
+    assert record.reading_uuid == reading.reading_uuid.int
+    assert record.value == "5.50"
+
+    assert record.to_reading() == reading
+    assert record.to_reading().json() == reading.json()
+    # The reading is only created once.
+    assert record.to_reading() is record.to_reading()
+    assert pickle.loads(pickle.dumps(record)) == record
+    assert not hasattr(record, "__dict__")
+
+
+def test_record_from_columns():
+    """Test that records can be made from stored (naive UTC) columns."""
+    reading_uuid, patient_uuid = uuid4(), uuid4()
+    record = ReadingRecord.from_columns(
+        str(reading_uuid), str(patient_uuid), "5.5", "mmol/L", dt.datetime(2022, 3, 1)
+    )
+    assert record == ReadingRecord(
+        reading_uuid.int,
+        patient_uuid.int,
+        "5.5",
+        "mmol/L",
+        to_epoch_micros(dt.datetime(2022, 3, 1, tzinfo=dt.timezone.utc)),
+    )
@@ -9,20 +9,30 @@ from tempfile import TemporaryDirectory
 from typing import Iterator
 from uuid import uuid4
 
+from pydantic import ValidationError
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
 
 from glucose_reading_store.exceptions import (
     DuplicateReading,
     NoSuchReading,
     NotInContext,
+    SchemaNotReady,
 )
 from glucose_reading_store.models import GlucoseReading
+from glucose_reading_store.records import ReadingRecord
 from glucose_reading_store.stores import (
     AbstractGlucoseReadingStore,
     SQLAlchemyGlucoseReadingStore,
     FakeGlucoseReadingStore,
 )
+from glucose_reading_store.stores import sqlalchemy as sqlalchemy_store
+from glucose_reading_store.stores.sqlalchemy import (
+    PATIENT_TIME_INDEX,
+    SCHEMA_VERSION,
+    clear_schema_cache,
+    get_schema_version,
+)
 
 
 @pytest.fixture
@@ -51,6 +61,34 @@ def sqlite_store() -> Iterator[SQLAlchemyGlucoseReadingStore]:
         yield SQLAlchemyGlucoseReadingStore(engine)
 
 
+@pytest.fixture
+def sqlite_store_without_upsert(
+    monkeypatch: pytest.MonkeyPatch, sqlite_store: SQLAlchemyGlucoseReadingStore
+) -> Iterator[SQLAlchemyGlucoseReadingStore]:
+    """
+    A fixture providing a store using SQLite which doesn't use upserts, as
+    for databases which don't support them.
+
+    """
+    monkeypatch.setattr(sqlalchemy_store, "_UPSERT_INSERTS", {})
+    yield sqlite_store
+
+
+@pytest.fixture
+def unique_fake_store() -> Iterator[FakeGlucoseReadingStore]:
+    """A fixture providing a fake store with unique patient reading times."""
+    yield FakeGlucoseReadingStore(unique_patient_time=True)
+
+
+@pytest.fixture
+def unique_sqlite_store() -> Iterator[SQLAlchemyGlucoseReadingStore]:
+    """A fixture providing a SQLite store with unique patient reading times."""
+    with TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir, "some_db.db")
+        engine = create_engine(f"sqlite:///{path}")
+        yield SQLAlchemyGlucoseReadingStore(engine, unique_patient_time=True)
+
+
 @pytest.mark.parametrize("store_fixture", ["sqlite_store", "fake_store"])
 def test_store_add_get(
     request: pytest.FixtureRequest, store_fixture: str, reading: GlucoseReading
@@ -161,9 +199,389 @@ def test_delete_missing_reading_raises(
             store.delete_reading(reading.reading_uuid)
 
 
+@pytest.mark.parametrize("store_fixture", ["sqlite_store", "fake_store"])
+def test_find_reading(
+    request: pytest.FixtureRequest, store_fixture: str, reading: GlucoseReading
+):
+    """Test that readings can be found from their patient and recording time."""
+    store: AbstractGlucoseReadingStore = request.getfixturevalue(store_fixture)
+
+    with store:
+        with pytest.raises(NoSuchReading):
+            store.find_reading(reading.patient_uuid, reading.recorded_at)
+
+        store.add_reading(reading)
+        assert store.find_reading(reading.patient_uuid, reading.recorded_at) == reading
+
+
+@pytest.mark.parametrize("store_fixture", ["sqlite_store", "fake_store"])
+def test_duplicate_patient_time_allowed(
+    request: pytest.FixtureRequest, store_fixture: str, reading: GlucoseReading
+):
+    """
+    Test that readings for the same patient at the same time are allowed
+    unless the store enforces it.
+
+    """
+    store: AbstractGlucoseReadingStore = request.getfixturevalue(store_fixture)
+
+    with store:
+        store.add_reading(reading)
+        store.add_reading(reading.copy(update={"reading_uuid": uuid4()}))
+        assert len(list(store)) == 2
+
+
+@pytest.mark.parametrize("store_fixture", ["unique_sqlite_store", "unique_fake_store"])
+def test_duplicate_patient_time_raises(
+    request: pytest.FixtureRequest, store_fixture: str, reading: GlucoseReading
+):
+    """
+    Test that `DuplicateReading` errors are raised when an attempt is made to
+    add or move a reading to the same patient and time as another reading,
+    if the store enforces it.
+
+    """
+    store: AbstractGlucoseReadingStore = request.getfixturevalue(store_fixture)
+
+    with store:
+        store.add_reading(reading)
+
+    with store:
+        with pytest.raises(DuplicateReading):
+            store.add_reading(reading.copy(update={"reading_uuid": uuid4()}))
+
+    other_reading = reading.copy(
+        update={
+            "reading_uuid": uuid4(),
+            "recorded_at": reading.recorded_at - dt.timedelta(minutes=5),
+        }
+    )
+    with store:
+        store.add_reading(other_reading)
+
+        # The error names the reading already at that time.
+        with pytest.raises(DuplicateReading, match=str(reading.reading_uuid)):
+            store.update_reading(
+                other_reading.copy(update={"recorded_at": reading.recorded_at})
+            )
+
+
+@pytest.mark.parametrize("store_fixture", ["sqlite_store", "fake_store"])
+def test_iterate_reading_columns(
+    request: pytest.FixtureRequest, store_fixture: str, reading: GlucoseReading
+):
+    """Test that readings can be filtered and iterated through as columns."""
+    store: AbstractGlucoseReadingStore = request.getfixturevalue(store_fixture)
+
+    readings = [
+        reading.copy(
+            update={
+                "reading_uuid": uuid4(),
+                "recorded_at": reading.recorded_at + dt.timedelta(minutes=minutes),
+            }
+        )
+        for minutes in range(5)
+    ]
+    with store:
+        for other_reading in readings:
+            store.add_reading(other_reading)
+        store.add_reading(
+            reading.copy(update={"reading_uuid": uuid4(), "patient_uuid": uuid4()})
+        )
+
+    chunks = list(
+        store.iterate_reading_columns(
+            patient_uuids=[reading.patient_uuid],
+            start=readings[1].recorded_at,
+            end=readings[4].recorded_at,
+            chunk_size=2,
+        )
+    )
+    assert [len(chunk["reading_uuid"]) for chunk in chunks] == [2, 1]
+
+    reading_uuids = {
+        reading_uuid for chunk in chunks for reading_uuid in chunk["reading_uuid"]
+    }
+    assert reading_uuids == {str(other.reading_uuid) for other in readings[1:4]}
+    assert chunks[0]["recorded_at"][0].tzinfo is None
+
+
+@pytest.mark.parametrize("store_fixture", ["sqlite_store", "fake_store"])
+def test_store_add_readings(
+    request: pytest.FixtureRequest, store_fixture: str, reading: GlucoseReading
+):
+    """
+    Test that readings can be added in bulk, and that none are added if any
+    are duplicates.
+
+    """
+    store: AbstractGlucoseReadingStore = request.getfixturevalue(store_fixture)
+    readings = [reading.copy(update={"reading_uuid": uuid4()}) for _ in range(3)]
+
+    with store:
+        store.add_readings(readings)
+
+    with store:
+        with pytest.raises(DuplicateReading):
+            store.add_readings([reading, readings[0]])
+
+    with store:
+        assert sorted(store, key=str) == sorted(readings, key=str)
+
+
+@pytest.mark.parametrize("store_fixture", ["sqlite_store", "fake_store"])
+def test_store_add_new_records(
+    request: pytest.FixtureRequest, store_fixture: str, reading: GlucoseReading
+):
+    """Test that readings already in the store are skipped when adding records."""
+    store: AbstractGlucoseReadingStore = request.getfixturevalue(store_fixture)
+    readings = [reading.copy(update={"reading_uuid": uuid4()}) for _ in range(3)]
+    records = [ReadingRecord.from_reading(reading) for reading in readings]
+
+    with store:
+        store.add_readings(readings[:1])
+    with store:
+        assert store.add_new_records([*records, records[2]]) == 2
+    with store:
+        assert store.add_new_records(records) == 3
+        assert sorted(store, key=str) == sorted(readings, key=str)
+
+
+@pytest.mark.parametrize("store_fixture", ["sqlite_store", "fake_store"])
+def test_store_get_readings(
+    request: pytest.FixtureRequest, store_fixture: str, reading: GlucoseReading
+):
+    """Test that several readings can be fetched at once."""
+    store: AbstractGlucoseReadingStore = request.getfixturevalue(store_fixture)
+    readings = [reading.copy(update={"reading_uuid": uuid4()}) for _ in range(3)]
+    missing_uuid = uuid4()
+
+    with store:
+        store.add_readings(readings)
+        found = store.get_readings(
+            [str(readings[0].reading_uuid), missing_uuid, readings[2].reading_uuid]
+        )
+    assert found == {
+        readings[0].reading_uuid: readings[0],
+        readings[2].reading_uuid: readings[2],
+    }
+
+
+@pytest.mark.parametrize(
+    "store_fixture", ["sqlite_store", "sqlite_store_without_upsert", "fake_store"]
+)
+def test_latest_reading(
+    request: pytest.FixtureRequest, store_fixture: str, reading: GlucoseReading
+):
+    """
+    Test that the latest reading for a patient is kept up to date as
+    readings are added, updated and deleted.
+
+    """
+    store: AbstractGlucoseReadingStore = request.getfixturevalue(store_fixture)
+    earlier = reading.copy(
+        update={
+            "reading_uuid": uuid4(),
+            "recorded_at": reading.recorded_at - dt.timedelta(hours=1),
+        }
+    )
+    later = reading.copy(
+        update={
+            "reading_uuid": uuid4(),
+            "recorded_at": reading.recorded_at + dt.timedelta(hours=1),
+        }
+    )
+    patient_uuid = reading.patient_uuid
+
+    with store:
+        with pytest.raises(NoSuchReading):
+            store.get_latest_reading(patient_uuid)
+
+        store.add_reading(reading)
+        store.add_readings([earlier, later])
+        assert store.get_latest_reading(patient_uuid) == later
+
+        # Moving the latest reading back in time promotes the next latest.
+        store.update_reading(
+            later.copy(update={"recorded_at": earlier.recorded_at - dt.timedelta(1)})
+        )
+        assert store.get_latest_reading(patient_uuid) == reading
+
+        # Moving a reading to another patient updates both patients.
+        other_patient_uuid = uuid4()
+        store.update_reading(reading.copy(update={"patient_uuid": other_patient_uuid}))
+        assert store.get_latest_reading(patient_uuid) == earlier
+        assert store.get_latest_readings(
+            [patient_uuid, other_patient_uuid, uuid4()]
+        ) == {
+            patient_uuid: earlier,
+            other_patient_uuid: reading.copy(
+                update={"patient_uuid": other_patient_uuid}
+            ),
+        }
+
+        store.delete_reading(earlier.reading_uuid)
+        assert store.get_latest_reading(patient_uuid).reading_uuid == later.reading_uuid
+        store.delete_reading(later.reading_uuid)
+        assert store.get_latest_readings([patient_uuid]) == {}
+
+
+def test_sqlite_store_rebuilds_latest_readings(
+    sqlite_store: SQLAlchemyGlucoseReadingStore, reading: GlucoseReading
+):
+    """
+    Test that the latest readings are built from the readings in databases
+    created before they were added.
+
+    """
+    engine = sqlite_store._engine  # pylint: disable=protected-access
+    with sqlite_store:
+        sqlite_store.add_reading(reading)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP TABLE latest_readings")
+        connection.exec_driver_sql("DROP TABLE schema_version")
+    clear_schema_cache()
+
+    store = SQLAlchemyGlucoseReadingStore(engine)
+    with store:
+        assert store.get_latest_reading(reading.patient_uuid) == reading
+
+
+def test_sqlite_store_validates_readings(
+    sqlite_store: SQLAlchemyGlucoseReadingStore, reading: GlucoseReading
+):
+    """Test that invalid readings written to the database by others are rejected."""
+    engine = sqlite_store._engine  # pylint: disable=protected-access
+    with sqlite_store:
+        sqlite_store.add_reading(reading)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("UPDATE readings SET unit = 'mmol'")
+
+    with sqlite_store:
+        with pytest.raises(ValidationError):
+            sqlite_store.get_reading(reading.reading_uuid)
+        with pytest.raises(ValidationError):
+            list(sqlite_store.iterate_readings())
+
+
+def test_sqlite_store_creates_new_indexes(
+    sqlite_store: SQLAlchemyGlucoseReadingStore,
+):
+    """
+    Test that indexes are added to the tables of databases created before
+    the indexes were added.
+
+    """
+    engine = sqlite_store._engine  # pylint: disable=protected-access
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP INDEX ix_readings_patient_uuid_recorded_at")
+        connection.exec_driver_sql("DROP TABLE schema_version")
+    clear_schema_cache()
+
+    SQLAlchemyGlucoseReadingStore(engine)
+    assert "ix_readings_patient_uuid_recorded_at" in {
+        index["name"] for index in inspect(engine).get_indexes("readings")
+    }
+
+
+def test_sqlite_store_without_indexes(sqlite_store: SQLAlchemyGlucoseReadingStore):
+    """Test that indexes are dropped and rebuilt around a bulk load."""
+    engine = sqlite_store._engine  # pylint: disable=protected-access
+    indexes = inspect(engine).get_indexes("readings")
+    assert indexes
+
+    with sqlite_store.without_indexes():
+        assert not inspect(engine).get_indexes("readings")
+    assert inspect(engine).get_indexes("readings") == indexes
+
+
 def test_sqlite_store_requires_context(
     sqlite_store: SQLAlchemyGlucoseReadingStore, reading: GlucoseReading
 ):
     """Test that the SQLite store raises an error if used outside a context."""
     with pytest.raises(NotInContext):
         sqlite_store.add_reading(reading)
+
+
+def test_sqlite_schema_modes():
+    """
+    Test that the schema is only created in 'create' mode, and that it's
+    verified once per database.
+
+    """
+    with TemporaryDirectory() as temp_dir:
+        engine = create_engine(f"sqlite:///{Path(temp_dir, 'some_db.db')}")
+        with pytest.raises(SchemaNotReady):
+            SQLAlchemyGlucoseReadingStore(engine, schema_mode="verify")
+        # Skipping the schema doesn't touch the database.
+        SQLAlchemyGlucoseReadingStore(engine, schema_mode="skip")
+        assert get_schema_version(engine) is None
+
+        SQLAlchemyGlucoseReadingStore(engine)
+        assert get_schema_version(engine) == SCHEMA_VERSION
+        SQLAlchemyGlucoseReadingStore(engine, schema_mode="verify")
+
+        # A verified schema isn't checked again in the same process.
+        with engine.begin() as connection:
+            connection.exec_driver_sql("DELETE FROM schema_version")
+        SQLAlchemyGlucoseReadingStore(engine, schema_mode="verify")
+        clear_schema_cache()
+        with pytest.raises(SchemaNotReady):
+            SQLAlchemyGlucoseReadingStore(engine, schema_mode="verify")
+
+        with pytest.raises(ValueError):
+            SQLAlchemyGlucoseReadingStore(engine, schema_mode="drop")
+
+
+def test_sqlite_schema_modes_with_unique_index():
+    """
+    Test that the unique index on patients' reading times is only created in
+    'create' mode, and that it's recorded with the schema version.
+
+    """
+    with TemporaryDirectory() as temp_dir:
+        engine = create_engine(f"sqlite:///{Path(temp_dir, 'some_db.db')}")
+        SQLAlchemyGlucoseReadingStore(engine)
+        with pytest.raises(SchemaNotReady):
+            SQLAlchemyGlucoseReadingStore(
+                engine, unique_patient_time=True, schema_mode="verify"
+            )
+
+        SQLAlchemyGlucoseReadingStore(engine, unique_patient_time=True)
+        assert PATIENT_TIME_INDEX.name in {
+            index["name"] for index in inspect(engine).get_indexes("readings")
+        }
+
+        # The index is found from the version marker.
+        clear_schema_cache()
+        with engine.begin() as connection:
+            connection.exec_driver_sql(f"DROP INDEX {PATIENT_TIME_INDEX.name}")
+        SQLAlchemyGlucoseReadingStore(
+            engine, unique_patient_time=True, schema_mode="verify"
+        )
+        SQLAlchemyGlucoseReadingStore(engine, schema_mode="verify")
+
+
+def test_sqlite_store_updates_schema_marker():
+    """Test that version markers from before the unique index was recorded are updated."""
+    with TemporaryDirectory() as temp_dir:
+        engine = create_engine(f"sqlite:///{Path(temp_dir, 'some_db.db')}")
+        SQLAlchemyGlucoseReadingStore(engine, unique_patient_time=True)
+        with engine.begin() as connection:
+            connection.exec_driver_sql("DROP TABLE schema_version")
+            connection.exec_driver_sql(
+                "CREATE TABLE schema_version (version INTEGER PRIMARY KEY)"
+            )
+            connection.exec_driver_sql("INSERT INTO schema_version VALUES (1)")
+        clear_schema_cache()
+
+        assert get_schema_version(engine) == 1
+        with pytest.raises(SchemaNotReady):
+            SQLAlchemyGlucoseReadingStore(engine, schema_mode="verify")
+        SQLAlchemyGlucoseReadingStore(engine)
+        assert get_schema_version(engine) == SCHEMA_VERSION
+        # The existing unique index is recorded too.
+        clear_schema_cache()
+        SQLAlchemyGlucoseReadingStore(
+            engine, unique_patient_time=True, schema_mode="verify"
+        )